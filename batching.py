@@ -0,0 +1,74 @@
+import asyncio
+
+
+class MicroBatcher:
+    """Collects items submitted within a short window and flushes them together.
+
+    A batch is flushed when it reaches max_size items or max_delay seconds
+    after its first item, whichever comes first. flush_fn is an async
+    callable that receives the list of items and returns one result per
+    item; each submitter gets its own result back (or the exception raised
+    by flush_fn).
+    """
+
+    def __init__(self, flush_fn, max_size: int, max_delay: float):
+        self.flush_fn = flush_fn
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    def submit_nowait(self, item) -> asyncio.Future:
+        """Queue an item and return the future for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_now)
+        return future
+
+    async def submit(self, item):
+        """Queue an item and wait for its result"""
+        return await self.submit_nowait(item)
+
+    async def submit_many(self, items: list) -> list:
+        """Queue several items back to back so they share a batch"""
+        futures = [self.submit_nowait(item) for item in items]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def flush(self):
+        """Flush whatever is pending and wait for all in-flight batches"""
+        self._flush_now()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list):
+        items = [item for item, _ in batch]
+        try:
+            results = await self.flush_fn(items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # The submitter may have given up (cancelled) while we were writing
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,475 @@
+"""Load and latency benchmark with in-process Gemini, Sheets and Telegram stand-ins.
+
+Replays a message corpus against the real handlers at a target arrival rate
+and prints a JSON report (latency percentiles, throughput, LLM and Sheets
+calls per message). Nothing leaves the process.
+
+    python benchmark.py --target message --rate 20 --count 500
+    python benchmark.py --target parse --llm-latency 1.5 --output bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import Config
+from expense import Expense
+from rule_parser import AMOUNT_RE, RuleParser
+
+DEFAULT_CORPUS = [
+    "chai 20",
+    "metro 40",
+    "uber 180",
+    "Spent 200 on pizza from Swiggy",
+    "Bought jeans for ₹1500 from Myntra",
+    "paid 650 for electricity",
+    "Today I spent 300 for groceries and 200 for phone accessories and 100 for petrol",
+    "movie tickets 450 with friends",
+    "gave 120 to the maid",
+    "dinner 900, auto 80, ice cream 60",
+    "medicine 340 at apollo",
+    "netflix 199",
+]
+
+
+class Counters:
+    """Thread-safe call counters shared by the fakes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {'llm_calls': 0, 'llm_errors': 0, 'sheets_calls': 0,
+                       'sheets_errors': 0, 'telegram_calls': 0}
+
+    def add(self, name: str, n: int = 1):
+        with self._lock:
+            self.values[name] += n
+
+
+COUNTERS = Counters()
+RULES = RuleParser()
+
+
+def _fake_expenses(message: str) -> list:
+    """One plausible expense per amount in the message"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    expenses = []
+    for amount in AMOUNT_RE.findall(message) or ["0"]:
+        category, sub_category, item = RULES.categorize(message)
+        expenses.append({
+            "date": today, "amount": float(amount), "currency": "INR",
+            "category": category, "sub_category": sub_category, "item": item,
+            "vendor": RULES.extract_vendor(message), "payment_mode": "Unknown", "notes": "",
+        })
+    return expenses
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeStream:
+    def __init__(self, text: str, chunk_size: int, delay: float):
+        self.text, self.chunk_size, self.delay = text, chunk_size, delay
+
+    async def __aiter__(self):
+        for i in range(0, len(self.text), self.chunk_size):
+            await asyncio.sleep(self.delay)
+            yield _FakeResponse(self.text[i:i + self.chunk_size])
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel with configurable latency and errors"""
+
+    latency = 0.8
+    jitter = 0.4
+    error_rate = 0.0
+    # Fraction of calls that stall for tail_latency seconds instead
+    tail_rate = 0.0
+    tail_latency = 10.0
+
+    def __init__(self, model_name: str = None):
+        self.model_name = model_name
+
+    def _delay(self) -> float:
+        if random.random() < self.tail_rate:
+            return self.tail_latency
+        return max(0.0, random.gauss(self.latency, self.jitter))
+
+    def _reply(self, prompt: str) -> str:
+        batch = re.search(r'^Messages: (\[.*\])$', prompt, re.MULTILINE)
+        if batch:
+            return json.dumps([
+                {"id": entry["id"], "expenses": _fake_expenses(entry["message"])}
+                for entry in json.loads(batch.group(1))
+            ])
+        single = re.search(r'^User message: (".*")$', prompt, re.MULTILINE)
+        return json.dumps(_fake_expenses(json.loads(single.group(1)) if single else prompt))
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, **kwargs):
+        COUNTERS.add('llm_calls')
+        if random.random() < self.error_rate:
+            await asyncio.sleep(self._delay())
+            COUNTERS.add('llm_errors')
+            raise RuntimeError("fake Gemini error")
+        text = self._reply(prompt)
+        if stream:
+            # Spread the same total latency over the chunks
+            chunks = max(1, len(text) // 64)
+            return _FakeStream(text, 64, self._delay() / chunks)
+        await asyncio.sleep(self._delay())
+        return _FakeResponse(text)
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        COUNTERS.add('llm_calls')
+        time.sleep(self._delay())
+        return _FakeResponse(self._reply(prompt))
+
+
+class FakeWorksheet:
+    """In-memory gspread worksheet; sheet calls block the calling thread like the real client"""
+
+    latency = 0.3
+    error_rate = 0.0
+
+    def __init__(self, title: str, grid_rows: int = 1000):
+        self.title = title
+        self.rows = []
+        self.grid_rows = grid_rows
+        self.modified = time.time()
+        self._lock = threading.Lock()
+
+    def _call(self):
+        COUNTERS.add('sheets_calls')
+        time.sleep(max(0.0, random.gauss(self.latency, self.latency / 4)))
+        if random.random() < self.error_rate:
+            COUNTERS.add('sheets_errors')
+            raise RuntimeError("fake Sheets error (429)")
+
+    def append_row(self, row, **kwargs):
+        return self.append_rows([row], **kwargs)
+
+    def append_rows(self, rows, **kwargs):
+        self._call()
+        with self._lock:
+            start = len(self.rows) + 1
+            self.rows.extend(list(r) for r in rows)
+            end = len(self.rows)
+            self.modified = time.time()
+        return {'updates': {'updatedRange': f"{self.title}!A{start}:K{end}"}}
+
+    def get(self, range_name, **kwargs):
+        self._call()
+        match = re.match(r'([A-Z])(\d+):([A-Z])(\d*)', range_name)
+        first_col = ord(match.group(1)) - ord('A')
+        last_col = ord(match.group(3)) - ord('A')
+        start = int(match.group(2))
+        with self._lock:
+            end = int(match.group(4)) if match.group(4) else len(self.rows)
+            values = [list(r[first_col:last_col + 1]) for r in self.rows[start - 1:end]]
+        # Like the API, trailing empty rows are not returned
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def delete_rows(self, start_index, end_index=None):
+        self._call()
+        with self._lock:
+            del self.rows[start_index - 1:(end_index or start_index)]
+            self.modified = time.time()
+
+    def get_all_values(self, **kwargs):
+        self._call()
+        with self._lock:
+            return [list(r) for r in self.rows]
+
+    def format(self, *args, **kwargs):
+        self._call()
+
+    @property
+    def col_count(self) -> int:
+        return 12
+
+    @property
+    def row_count(self) -> int:
+        # Appends grow the grid
+        return max(self.grid_rows, len(self.rows))
+
+    def acell(self, label, **kwargs):
+        self._call()
+        row, col = int(label[1:]), ord(label[0]) - ord('A')
+        with self._lock:
+            cells = self.rows[row - 1] if row <= len(self.rows) else []
+        return _Obj(value=cells[col] if col < len(cells) else None)
+
+    def update_acell(self, label, value):
+        self._call()
+
+    def update(self, values, range_name=None, **kwargs):
+        self._call()
+        start = int(re.match(r'[A-Z]+(\d+)', range_name).group(1))
+        with self._lock:
+            for i, row in enumerate(values):
+                if start + i <= len(self.rows):
+                    self.rows[start + i - 1] = list(row)
+            self.modified = time.time()
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self._worksheets = {}
+        self.created = 0.0
+
+    def worksheet(self, title: str):
+        import gspread
+        if title not in self._worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 11, **kwargs):
+        self._worksheets[title] = FakeWorksheet(title, grid_rows=rows)
+        self.created = time.time()
+        return self._worksheets[title]
+
+    def get_lastUpdateTime(self):
+        COUNTERS.add('sheets_calls')
+        modified = max([ws.modified for ws in self._worksheets.values()] + [self.created])
+        return datetime.fromtimestamp(modified, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+    def worksheets(self):
+        return list(self._worksheets.values())
+
+    def values_batch_get(self, ranges, **kwargs):
+        value_ranges = []
+        for range_name in ranges:
+            title, cells = range_name.rsplit('!', 1)
+            worksheet = self._worksheets[title.strip("'")]
+            value_ranges.append({'range': range_name, 'values': worksheet.get(cells)})
+        return {'valueRanges': value_ranges}
+
+
+class FakeClient:
+    def __init__(self):
+        self.spreadsheet = FakeSpreadsheet()
+
+    def open_by_key(self, key):
+        return self.spreadsheet
+
+
+class FakeCredentials:
+    @classmethod
+    def from_json_keyfile_name(cls, filename, scope):
+        return cls()
+
+
+class FakeMessage:
+    """Minimal telegram.Message: replies and edits cost one fake Telegram round-trip"""
+
+    latency = 0.05
+
+    def __init__(self, text: str = "", chat_id: int = 0):
+        self.text = text
+        self.chat_id = chat_id
+        self.date = datetime.now(timezone.utc)
+
+    async def _call(self):
+        COUNTERS.add('telegram_calls')
+        await asyncio.sleep(self.latency)
+
+    async def reply_text(self, text, **kwargs):
+        await self._call()
+        return FakeMessage(text, self.chat_id)
+
+    async def edit_text(self, text, **kwargs):
+        await self._call()
+        return self
+
+    async def reply_document(self, document, **kwargs):
+        await self._call()
+        return FakeMessage("", self.chat_id)
+
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def fake_update(update_id: int, text: str, user_id: int):
+    message = FakeMessage(text, chat_id=user_id)
+    return _Obj(
+        update_id=update_id,
+        message=message,
+        effective_message=message,
+        effective_user=_Obj(id=user_id),
+        effective_chat=_Obj(id=user_id),
+    )
+
+
+def install_fakes(args):
+    """Swap the SDK entry points for the fakes before the bot modules build clients"""
+    FakeGenerativeModel.latency = args.llm_latency
+    FakeGenerativeModel.jitter = args.llm_jitter
+    FakeGenerativeModel.error_rate = args.llm_error_rate
+    FakeGenerativeModel.tail_rate = args.llm_tail_rate
+    FakeGenerativeModel.tail_latency = args.llm_tail_latency
+    FakeWorksheet.latency = args.sheets_latency
+    FakeWorksheet.error_rate = args.sheets_error_rate
+    FakeMessage.latency = args.telegram_latency
+
+    workdir = tempfile.mkdtemp(prefix="expense-bench-")
+    Config.LEDGER_PATH = os.path.join(workdir, "ledger.db")
+    Config.SPOOL_PATH = os.path.join(workdir, "spool.jsonl")
+    Config.PARSE_CACHE_PATH = ""
+    # The corpus repeats messages on purpose; they must not be answered as duplicates
+    Config.DEDUP_WINDOW = 0
+    Config.DEDUP_PATH = ""
+    Config.SHEETS_WRITES_PER_MINUTE = args.sheets_writes_per_minute
+    Config.GEMINI_REQUESTS_PER_MINUTE = args.gemini_requests_per_minute
+    if not args.cache:
+        Config.PARSE_CACHE_SIZE = 1
+        Config.PARSE_CACHE_TTL = 1e-9
+
+    import gemini_parser
+    import sheets_client
+    gemini_parser.genai.GenerativeModel = FakeGenerativeModel
+    sheets_client.ServiceAccountCredentials = FakeCredentials
+    sheets_client.gspread.authorize = lambda *a, **k: FakeClient()
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def replay(args, corpus: list) -> dict:
+    import main
+    await main.warm_up()
+
+    async def drive(i: int, text: str):
+        user_id = 1000 + i % args.users
+        if args.target == 'message':
+            await main.handle_message(fake_update(i, text, user_id), None)
+        elif args.target == 'today':
+            await main.today_command(fake_update(i, "/today", user_id), None)
+        elif args.target == 'parse':
+            await main.parser.parse_expense(text, user_id)
+        elif args.target == 'sheets':
+            expense = Expense.from_dict({**_fake_expenses(text)[0], 'raw_message': text})
+            ok = await main.sheets.add_expense(expense, user_id=user_id)
+            if not ok:
+                raise RuntimeError("add_expense failed")
+
+    latencies, errors = [], 0
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def timed(i: int, text: str, scheduled: float):
+        nonlocal errors
+        await asyncio.sleep(max(0.0, scheduled - loop.time()))
+        try:
+            await drive(i, text)
+        except Exception:
+            errors += 1
+        # Open-loop: latency counts from the scheduled arrival, so queueing shows up
+        latencies.append(loop.time() - scheduled)
+
+    before = dict(COUNTERS.values)
+    tasks = [
+        asyncio.create_task(timed(i, corpus[i % len(corpus)], start + i / args.rate))
+        for i in range(args.count)
+    ]
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+    # Draining the spool is paced by the sheet quota; it's reported, not counted as throughput
+    drain_start = loop.time()
+    await main.sheets.flush()
+    drain = loop.time() - drain_start
+
+    calls = {k: COUNTERS.values[k] - before[k] for k in COUNTERS.values}
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        "target": args.target,
+        "messages": args.count,
+        "target_rate": args.rate,
+        "duration_s": round(elapsed, 3),
+        "throughput_msgs_per_s": round(args.count / elapsed, 2) if elapsed else 0.0,
+        "spool_drain_s": round(drain, 3),
+        "spool_left": len(main.sheets.spool),
+        "errors": errors,
+        "latency_ms": {
+            "p50": round(percentile(ms, 50), 2),
+            "p95": round(percentile(ms, 95), 2),
+            "p99": round(percentile(ms, 99), 2),
+            "max": round(ms[-1], 2) if ms else 0.0,
+            "mean": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        },
+        "llm_calls_per_message": round(calls['llm_calls'] / args.count, 3),
+        "sheets_calls_per_message": round(calls['sheets_calls'] / args.count, 3),
+        "telegram_calls_per_message": round(calls['telegram_calls'] / args.count, 3),
+        "calls": calls,
+        "parser_stats": dict(main.parser.stats),
+        "gemini_scheduler": dict(main.parser.scheduler.stats),
+        "gemini_hedging": dict(
+            main.parser.hedger.stats,
+            hedge_rate=round(main.parser.hedger.hedge_rate, 3),
+            win_rate=round(main.parser.hedger.win_rate, 3),
+        ),
+        "parse_cache": main.parser.cache.stats,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--target', choices=['message', 'today', 'parse', 'sheets'], default='message')
+    ap.add_argument('--corpus', help="text file with one message per line (default: built-in)")
+    ap.add_argument('--count', type=int, default=300, help="number of requests to replay")
+    ap.add_argument('--rate', type=float, default=20.0, help="arrivals per second")
+    ap.add_argument('--users', type=int, default=50, help="distinct simulated users")
+    ap.add_argument('--llm-latency', type=float, default=0.8)
+    ap.add_argument('--llm-jitter', type=float, default=0.4)
+    ap.add_argument('--llm-error-rate', type=float, default=0.0)
+    ap.add_argument('--llm-tail-rate', type=float, default=0.0,
+                    help="fraction of Gemini calls that take --llm-tail-latency")
+    ap.add_argument('--llm-tail-latency', type=float, default=10.0)
+    ap.add_argument('--sheets-latency', type=float, default=0.3)
+    ap.add_argument('--sheets-error-rate', type=float, default=0.0)
+    ap.add_argument('--sheets-writes-per-minute', type=float, default=Config.SHEETS_WRITES_PER_MINUTE)
+    ap.add_argument('--gemini-requests-per-minute', type=float, default=Config.GEMINI_REQUESTS_PER_MINUTE)
+    ap.add_argument('--telegram-latency', type=float, default=0.05)
+    ap.add_argument('--no-cache', dest='cache', action='store_false', help="disable the parse cache")
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    corpus = DEFAULT_CORPUS
+    if args.corpus:
+        with open(args.corpus, encoding='utf-8') as f:
+            corpus = [line.strip() for line in f if line.strip()]
+
+    install_fakes(args)
+    # Keep the bot's own progress prints out of the machine-readable report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(replay(args, corpus))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from config import Config
+
+TOTAL = ''   # budgets key for the overall monthly budget
+
+
+def _month_bounds(day: date) -> tuple:
+    start = day.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+class BudgetTracker:
+    """Per-user monthly budgets with running spend totals.
+
+    Totals for the current month are summed from the ledger once (at
+    startup and when the month rolls over) and then kept up to date as
+    expenses are saved, so checking a save against its budgets is a couple
+    of dict lookups and never touches the sheet.
+    
+    With worker processes sharing the ledger, a write by another process
+    (seen as a new SQLite data_version) reloads the budgets and re-sums
+    each user's spend the next time that user is checked.
+    """
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        # (user_id, category) -> amount; category TOTAL is the monthly budget
+        self.limits = {}
+        self.spent = defaultdict(float)   # (user_id, category or TOTAL) -> this month's spend
+        self.month = None
+        self._data_version = None
+        self._fresh = None   # users re-summed since another process last wrote (None = all)
+        self.rebuild()
+
+    def rebuild(self, today: date = None):
+        """Re-sum this month's spend per user and category from the ledger"""
+        today = today or date.today()
+        start, end = _month_bounds(today)
+        self._data_version = self.ledger.version[0]
+        self.limits = {(uid, category): amount for uid, category, amount in self.ledger.get_budgets()}
+        self.month = (today.year, today.month)
+        self.spent = defaultdict(float)
+        self._fresh = None
+        for user_id, category, total in self.ledger.category_totals(start.isoformat(), end.isoformat()):
+            self.spent[(user_id, category)] += total
+            self.spent[(user_id, TOTAL)] += total
+
+    def _refresh(self, user_id: int, today: date) -> bool:
+        """Bring the month and this user's totals up to date; True if re-summed from the ledger"""
+        if (today.year, today.month) != self.month:
+            self.rebuild(today)
+            return True
+        
+        data_version = self.ledger.version[0]
+        if data_version != self._data_version:
+            # Another process wrote to the ledger: any user's totals may be behind
+            self._data_version = data_version
+            self.limits = {(uid, category): amount for uid, category, amount in self.ledger.get_budgets()}
+            self._fresh = set()
+        if self._fresh is None or user_id in self._fresh:
+            return False
+        
+        self._fresh.add(user_id)
+        start, end = _month_bounds(today)
+        for key in [key for key in self.spent if key[0] == user_id]:
+            del self.spent[key]
+        for uid, category, total in self.ledger.category_totals(start.isoformat(), end.isoformat(), user_id):
+            self.spent[(uid, category)] += total
+            self.spent[(uid, TOTAL)] += total
+        return True
+
+    def record(self, user_id: int, expense) -> list:
+        """Add a saved expense to the running totals; returns alert lines for thresholds it crossed"""
+        # The ledger already holds this expense, so totals re-summed from it count it
+        counted = self._refresh(user_id, date.today())
+        
+        day = date.fromordinal(expense.day)
+        if (day.year, day.month) != self.month or user_id is None:
+            return []
+        
+        alerts = []
+        for category in (expense.category, TOTAL):
+            key = (user_id, category)
+            after = self.spent[key] + (0 if counted else expense.amount)
+            before = after - expense.amount
+            self.spent[key] = after
+            
+            limit = self.limits.get(key)
+            if not limit:
+                continue
+            for threshold in sorted(Config.BUDGET_ALERT_THRESHOLDS, reverse=True):
+                if before < threshold * limit <= after:
+                    alerts.append(self._alert(category, threshold, after, limit))
+                    break
+        return alerts
+
+    def replace(self, user_id: int, old, new):
+        """Move a corrected expense's spend in place (new None: it was removed); no alerts"""
+        # The ledger already holds the correction, so totals re-summed from it count it
+        if self._refresh(user_id, date.today()) or user_id is None:
+            return
+        for expense, sign in ((old, -1), (new, 1)):
+            if expense is None:
+                continue
+            day = date.fromordinal(expense.day)
+            if (day.year, day.month) != self.month:
+                continue
+            for category in (expense.category, TOTAL):
+                self.spent[(user_id, category)] += sign * expense.amount
+
+    @staticmethod
+    def _alert(category: str, threshold: float, spent: float, limit: float) -> str:
+        name = f"{category} budget" if category else "monthly budget"
+        if threshold >= 1:
+            return f"🚨 Over your {name}: ₹{spent:.2f} of ₹{limit:.2f}"
+        return f"⚠️ {threshold:.0%} of your {name} used: ₹{spent:.2f} of ₹{limit:.2f}"
+
+    def set_budget(self, user_id: int, amount: float, category: str = TOTAL):
+        self.ledger.set_budget(user_id, category, amount)
+        if amount > 0:
+            self.limits[(user_id, category)] = amount
+        else:
+            self.limits.pop((user_id, category), None)
+
+    def status(self, user_id: int) -> list:
+        """[(category, spent, limit)] for the user's budgets, monthly total first"""
+        self._refresh(user_id, date.today())
+        return sorted(
+            (category, self.spent[(uid, category)], limit)
+            for (uid, category), limit in self.limits.items()
+            if uid == user_id
+        )
@@ -9,8 +9,127 @@ class Config:
     GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
     CREDENTIALS_FILE = "credentials.json"
     SHEET_NAME = "Expenses"
+    LEDGER_PATH = os.getenv("LEDGER_PATH", "ledger.db")
     
     # Currency defaults
     DEFAULT_CURRENCY = "INR"
     TIMEZONE = "Asia/Kolkata"
 
+    # Gemini call limits
+    GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+    GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 20))
+    # Micro-batching of concurrent messages into one Gemini request
+    GEMINI_BATCH_MAX_SIZE = int(os.getenv("GEMINI_BATCH_MAX_SIZE", 8))
+    GEMINI_BATCH_WINDOW = float(os.getenv("GEMINI_BATCH_WINDOW", 0.05))
+    # Gemini quota budget shared by all users (free tier: 10 RPM, 250k TPM)
+    GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 10))
+    GEMINI_REQUEST_BURST = float(os.getenv("GEMINI_REQUEST_BURST", 5))
+    GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", 250000))
+    GEMINI_TOKEN_BURST = float(os.getenv("GEMINI_TOKEN_BURST", 50000))
+    # Messages this short (and with at most 2 amounts) jump ahead of bulk ones
+    GEMINI_INTERACTIVE_MAX_CHARS = int(os.getenv("GEMINI_INTERACTIVE_MAX_CHARS", 200))
+    # Longest a message waits for quota before the fallback parser takes it
+    GEMINI_QUEUE_MAX_WAIT = float(os.getenv("GEMINI_QUEUE_MAX_WAIT", 5))
+    GEMINI_BULK_MAX_WAIT = float(os.getenv("GEMINI_BULK_MAX_WAIT", 30))
+    # Hedging: a call slower than this percentile of recent ones is sent again
+    # (0 disables it); the first copy to answer wins
+    GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", 0.95))
+    GEMINI_HEDGE_MIN_DELAY = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", 0.5))
+    GEMINI_HEDGE_WINDOW = int(os.getenv("GEMINI_HEDGE_WINDOW", 200))
+    # Seconds a message waits for Gemini before it is answered by the fallback
+    # parser; the saved rows are corrected when Gemini answers (0 waits for it)
+    GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", 8))
+
+    # Messages with at least this many amounts are streamed (0 disables streaming)
+    GEMINI_STREAM_MIN_AMOUNTS = int(os.getenv("GEMINI_STREAM_MIN_AMOUNTS", 3))
+
+    # Local rule parser: messages scoring at least this skip Gemini
+    RULE_CONFIDENCE_THRESHOLD = float(os.getenv("RULE_CONFIDENCE_THRESHOLD", 0.8))
+    RULE_MAX_WORDS = int(os.getenv("RULE_MAX_WORDS", 6))
+    # Per-user item memory: trigram similarity needed to reuse a past categorization
+    ITEM_MEMORY_THRESHOLD = float(os.getenv("ITEM_MEMORY_THRESHOLD", 0.6))
+    ITEM_MEMORY_HISTORY = int(os.getenv("ITEM_MEMORY_HISTORY", 5000))
+    ITEM_MEMORY_USERS = int(os.getenv("ITEM_MEMORY_USERS", 1000))
+
+    # Parse-result cache ("" disables persistence)
+    PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", 5000))
+    PARSE_CACHE_TTL = float(os.getenv("PARSE_CACHE_TTL", 7 * 24 * 3600))
+    PARSE_CACHE_PATH = os.getenv("PARSE_CACHE_PATH", "parse_cache.json")
+
+    # Write-behind batching (spool writes, and rows per append_rows call)
+    SHEETS_BATCH_SIZE = int(os.getenv("SHEETS_BATCH_SIZE", 50))
+    SHEETS_FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", 0.3))
+
+    # Durable spool and paced background writes to the sheet
+    SPOOL_PATH = os.getenv("SPOOL_PATH", "spool.jsonl")
+    SPOOL_COMPACT_LINES = int(os.getenv("SPOOL_COMPACT_LINES", 10000))
+    SHEETS_WRITES_PER_MINUTE = float(os.getenv("SHEETS_WRITES_PER_MINUTE", 50))
+    SHEETS_WRITE_BURST = float(os.getenv("SHEETS_WRITE_BURST", 5))
+    SHEETS_MAX_BACKOFF = float(os.getenv("SHEETS_MAX_BACKOFF", 300))
+    SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 10))
+
+    # Sheet -> ledger sync (rows added or edited by hand)
+    SHEETS_SYNC_INTERVAL = float(os.getenv("SHEETS_SYNC_INTERVAL", 300))
+    SHEETS_SYNC_PAGE_SIZE = int(os.getenv("SHEETS_SYNC_PAGE_SIZE", 2000))
+    SHEETS_SYNC_BATCH_RANGES = int(os.getenv("SHEETS_SYNC_BATCH_RANGES", 50))
+    # Every this many seconds a sync re-reads each shard to catch edits above the
+    # watermark, unless the spreadsheet hasn't been modified since (Drive modifiedTime)
+    SHEETS_VERIFY_INTERVAL = float(os.getenv("SHEETS_VERIFY_INTERVAL", 3600))
+    # Pacing of sync reads (the Sheets API allows 60 reads/minute per user by default)
+    SHEETS_READS_PER_MINUTE = float(os.getenv("SHEETS_READS_PER_MINUTE", 40))
+    SHEETS_READ_BURST = float(os.getenv("SHEETS_READ_BURST", 5))
+
+    # One worksheet per "user", per "chat", or a single shared one ("none");
+    # see "Per-user worksheets" in README.md before switching
+    SHEET_SHARDING = os.getenv("SHEET_SHARDING", "none")
+    SHEETS_HTTP_POOL_SIZE = int(os.getenv("SHEETS_HTTP_POOL_SIZE", 10))
+    SHEETS_HANDLE_CACHE_SIZE = int(os.getenv("SHEETS_HANDLE_CACHE_SIZE", 256))
+    SHEETS_TOKEN_REFRESH_MARGIN = float(os.getenv("SHEETS_TOKEN_REFRESH_MARGIN", 300))
+
+    # /import of bank/UPI statements
+    IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", 20 * 1024 * 1024))
+    IMPORT_GEMINI_CHUNK = int(os.getenv("IMPORT_GEMINI_CHUNK", 40))
+    IMPORT_WRITE_CHUNK = int(os.getenv("IMPORT_WRITE_CHUNK", 200))
+    # Rows per append_rows call when draining the spool (imports fill it fast)
+    SHEETS_APPEND_MAX_ROWS = int(os.getenv("SHEETS_APPEND_MAX_ROWS", 500))
+
+    # Duplicate detection: updates, messages and expenses seen within the window
+    # (seconds; 0 disables it)
+    DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", 600))
+    DEDUP_PATH = os.getenv("DEDUP_PATH", "dedup_index.json")
+    DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", 100000))
+    DEDUP_MAX_CONFIRMATIONS = int(os.getenv("DEDUP_MAX_CONFIRMATIONS", 1000))
+
+    # Budget alerts fire when a save crosses these fractions of a budget
+    BUDGET_ALERT_THRESHOLDS = [
+        float(t) for t in os.getenv("BUDGET_ALERT_THRESHOLDS", "0.8,1.0").split(",")
+    ]
+
+    # /export and exporter.py: ledger rows read per page
+    EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", 1000))
+
+    # /week, /month and /category reports
+    REPORT_TOP_N = int(os.getenv("REPORT_TOP_N", 5))
+    REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", 64))
+
+    # Minimum seconds between progress edits of the "Processing..." reply
+    REPLY_EDIT_INTERVAL = float(os.getenv("REPLY_EDIT_INTERVAL", 1.0))
+
+    # Number of Telegram updates handled at the same time
+    MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", 32))
+    # Seconds an update may run before it is abandoned (its Gemini call is cancelled)
+    UPDATE_TIMEOUT = float(os.getenv("UPDATE_TIMEOUT", 120))
+    # Worker processes updates are sharded across by chat (0 = handle them in-process)
+    WORKERS = int(os.getenv("WORKERS", 0))
+
+    # How long updates arriving during startup wait for the backends
+    WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 120))
+
+    # HTTP server (health checks, webhook)
+    PORT = int(os.getenv("PORT", 10000))
+    # Public base URL of this service; when set, the bot uses a webhook instead of polling
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from config import Config
+
+
+def _key(*parts) -> str:
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=12).hexdigest()
+
+
+class DuplicateIndex:
+    """Hash index of recently handled updates, messages and saved expenses.
+
+    Keys are short digests of:
+      - the Telegram update id (redeliveries),
+      - (user, chat, normalized message text) (re-sends and double-taps),
+      - (user, chat, amount, item, vendor, date) (the same expense worded differently).
+    Keys include the user, so group members never match each other's messages.
+    Entries live for DEDUP_WINDOW seconds. They are kept in insertion
+    (= time) order, so expiry pops from the front, and every lookup is a
+    single dict probe however long the history is.
+    """
+
+    def __init__(self, window: float = None, path: str = None):
+        self.window = Config.DEDUP_WINDOW if window is None else window
+        self.path = path if path is not None else Config.DEDUP_PATH
+        self._entries = OrderedDict()   # key -> (stored_at, payload)
+        self._confirmations = OrderedDict()   # token -> (user_id, chat_id, text, expenses)
+        self._dirty = False
+        self.hits = 0
+        if self.path:
+            self.load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (stored_at, _) = next(iter(self._entries.items()))
+            if now - stored_at <= self.window and len(self._entries) <= Config.DEDUP_MAX_ENTRIES:
+                break
+            self._entries.popitem(last=False)
+            self._dirty = True
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] > self.window:
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def _put(self, key: str, payload):
+        now = time.time()
+        self._entries.pop(key, None)
+        self._entries[key] = (now, payload)
+        self._dirty = True
+        self._expire(now)
+
+    @staticmethod
+    def _message_key(user_id: int, chat_id: int, text: str) -> str:
+        return _key('message', user_id, chat_id, " ".join(text.lower().split()))
+
+    @staticmethod
+    def _expense_key(user_id: int, chat_id: int, expense) -> str:
+        return _key('expense', user_id, chat_id, round(expense.amount, 2), expense.item.lower(),
+                    expense.vendor.lower(), expense.day)
+
+    def seen_update(self, update_id: int) -> bool:
+        """True if this update was handled before; records it otherwise"""
+        if not self.enabled or update_id is None:
+            return False
+        key = _key('update', update_id)
+        if self._get(key) is not None:
+            return True
+        self._put(key, 1)
+        return False
+
+    def find_message(self, user_id: int, chat_id: int, text: str):
+        """The reply sent for the same message from this user in this chat within the window, or None"""
+        if not self.enabled:
+            return None
+        return self._get(self._message_key(user_id, chat_id, text))
+
+    def remember_message(self, user_id: int, chat_id: int, text: str, response: str):
+        if self.enabled:
+            self._put(self._message_key(user_id, chat_id, text), response)
+
+    def claim_expense(self, user_id: int, chat_id: int, expense, source: str) -> bool:
+        """Record an expense about to be saved; False if an earlier message saved it recently.
+        
+        source identifies the message being handled, so repeats within the
+        same message ("coffee 90, coffee 90") are not duplicates.
+        """
+        if not self.enabled:
+            return True
+        key = self._expense_key(user_id, chat_id, expense)
+        claimed_by = self._get(key)
+        if claimed_by is not None and claimed_by != source:
+            return False
+        self._put(key, source)
+        return True
+
+    def release_expense(self, user_id: int, chat_id: int, expense):
+        """Forget a claimed expense whose save failed, so a retry isn't flagged"""
+        if self._entries.pop(self._expense_key(user_id, chat_id, expense), None) is not None:
+            self._dirty = True
+
+    def confirmation_token(self, user_id: int, chat_id: int, text: str, expenses: list = None) -> str:
+        """Token for a "save anyway" button (fits in Telegram's 64-byte callback data).
+
+        With expenses, confirming saves exactly those; without, the message
+        is parsed again.
+        """
+        token = secrets.token_urlsafe(9)
+        self._confirmations[token] = (user_id, chat_id, text, expenses)
+        while len(self._confirmations) > Config.DEDUP_MAX_CONFIRMATIONS:
+            self._confirmations.popitem(last=False)
+        return token
+
+    def pop_confirmation(self, token: str):
+        """(user_id, chat_id, text, expenses) for a token, or None if unknown/expired"""
+        return self._confirmations.pop(token, None)
+
+    def load(self):
+        """Load persisted entries, skipping any that have expired"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error loading duplicate index: {e}")
+            return
+
+        now = time.time()
+        for key, (stored_at, payload) in data.items():
+            if now - stored_at <= self.window:
+                self._entries[key] = (stored_at, payload)
+        self._expire(now)
+
+    def save(self):
+        """Persist entries to disk (atomic replace); no-op when unchanged"""
+        if not self.path or not self._dirty:
+            return
+        self._expire(time.time())
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Error saving duplicate index: {e}")
@@ -0,0 +1,117 @@
+import sys
+from datetime import date as Date, datetime
+from config import Config
+from ledger import COLUMNS
+
+# Everything else is stored as given; these repeat on almost every row
+_INTERNED = ('currency', 'category', 'sub_category', 'item', 'vendor', 'payment_mode')
+
+
+def _intern(value, default: str = '') -> str:
+    return sys.intern(str(value)) if value not in (None, '') else default
+
+
+def _parse_day(value) -> int:
+    """Date ordinal from a date, datetime or YYYY-MM-DD string (today if unparseable)"""
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, Date):
+        return value.toordinal()
+    try:
+        return Date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return Date.today().toordinal()
+
+
+def _parse_ts(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return datetime.now().timestamp()
+
+
+class Expense:
+    """One parsed expense.
+
+    Slots instead of a per-row dict; the date is a day ordinal and the
+    timestamp epoch seconds, and the repeating text fields (category,
+    vendor, currency, ...) are interned so rows share a single copy of
+    each value. Attribute names match the sheet columns, with `date` and
+    `timestamp` rendered back to the sheet's string formats.
+    """
+
+    __slots__ = ('day', 'amount', 'currency', 'category', 'sub_category', 'item',
+                 'vendor', 'payment_mode', 'notes', 'raw_message', 'ts')
+
+    def __init__(self, amount: float = 0.0, category: str = "Other", sub_category: str = "",
+                 item: str = "", vendor: str = "Unknown", payment_mode: str = "Unknown",
+                 notes: str = "", raw_message: str = "", currency: str = None,
+                 day: int = None, ts: float = None):
+        now = datetime.now()
+        self.day = day if day is not None else now.date().toordinal()
+        self.amount = float(amount)
+        self.currency = _intern(currency, Config.DEFAULT_CURRENCY)
+        self.category = _intern(category, "Other")
+        self.sub_category = _intern(sub_category)
+        self.item = _intern(item)
+        self.vendor = _intern(vendor, "Unknown")
+        self.payment_mode = _intern(payment_mode, "Unknown")
+        self.notes = notes or ""
+        self.raw_message = raw_message or ""
+        self.ts = ts if ts is not None else now.timestamp()
+
+    @property
+    def date(self) -> str:
+        return Date.fromordinal(self.day).isoformat()
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.ts).isoformat()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Expense":
+        """From Gemini JSON / an old-style expense dict"""
+        fields = {k: data[k] for k in _INTERNED + ('notes', 'raw_message') if k in data}
+        return cls(
+            amount=data.get('amount') or 0,
+            day=_parse_day(data['date']) if data.get('date') else None,
+            ts=_parse_ts(data['timestamp']) if data.get('timestamp') else None,
+            **fields,
+        )
+
+    def to_dict(self) -> dict:
+        return {column: getattr(self, column) for column in COLUMNS}
+
+    @classmethod
+    def from_row(cls, row: list) -> "Expense":
+        """From a sheet row (column order as in ledger.COLUMNS)"""
+        return cls.from_dict(dict(zip(COLUMNS, row)))
+
+    def to_row(self) -> list:
+        """Sheet row, column order as in ledger.COLUMNS (without the row id)"""
+        return [
+            self.date, self.amount, self.currency, self.category, self.sub_category,
+            self.item, self.vendor, self.payment_mode, self.notes, self.raw_message,
+            self.timestamp,
+        ]
+
+    def stamped(self, message: str, now: datetime = None) -> "Expense":
+        """Copy dated now and attributed to message (for cached templates)"""
+        now = now or datetime.now()
+        copy = object.__new__(Expense)
+        for slot in self.__slots__:
+            setattr(copy, slot, getattr(self, slot))
+        copy.day = now.date().toordinal()
+        copy.ts = now.timestamp()
+        copy.raw_message = message
+        return copy
+
+    def __eq__(self, other):
+        if not isinstance(other, Expense):
+            return NotImplemented
+        return all(getattr(self, s) == getattr(other, s) for s in self.__slots__)
+
+    def __repr__(self):
+        return f"Expense({self.date} ₹{self.amount} {self.category}/{self.item} @ {self.vendor})"
@@ -0,0 +1,83 @@
+import argparse
+import csv
+import sys
+from config import Config
+from ledger import COLUMNS, Ledger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+
+FORMATS = ('csv', 'parquet')
+
+
+def export_csv(pages, out) -> int:
+    """Write pages of ledger rows to an open text file; returns the row count"""
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    count = 0
+    for page in pages:
+        writer.writerows(page)
+        count += len(page)
+    return count
+
+
+def export_parquet(pages, path: str) -> int:
+    """Write pages of ledger rows to a Parquet file, one row group per page"""
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = pa.schema([
+        (column, pa.float64() if column == 'amount' else pa.string()) for column in COLUMNS
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for page in pages:
+            columns = list(zip(*page))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            count += len(page)
+    return count
+
+
+def export(ledger: Ledger, path: str, fmt: str = 'csv', **filters) -> int:
+    """Stream the (filtered) ledger to path; filters: user_id, start, end, category"""
+    pages = ledger.iter_pages(page_size=Config.EXPORT_PAGE_SIZE, **filters)
+    if fmt == 'parquet':
+        return export_parquet(pages, path)
+    if fmt != 'csv':
+        raise ValueError(f"Unknown export format: {fmt}")
+    if path == '-':
+        return export_csv(pages, sys.stdout)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        return export_csv(pages, f)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export the local expense ledger")
+    ap.add_argument('-o', '--output', default='-', help="output file ('-' = stdout, CSV only)")
+    ap.add_argument('--format', choices=FORMATS, default='csv')
+    ap.add_argument('--from', dest='start', help="first date, YYYY-MM-DD")
+    ap.add_argument('--to', dest='end', help="last date, YYYY-MM-DD")
+    ap.add_argument('--category')
+    ap.add_argument('--user', dest='user_id', type=int, help="Telegram user id")
+    ap.add_argument('--ledger', default=Config.LEDGER_PATH, help="ledger database path")
+    args = ap.parse_args()
+    
+    if args.format == 'parquet' and args.output == '-':
+        ap.error("--format parquet needs --output")
+    
+    ledger = Ledger(args.ledger)
+    try:
+        count = export(ledger, args.output, args.format, user_id=args.user_id,
+                       start=args.start, end=args.end, category=args.category)
+    finally:
+        ledger.close()
+    print(f"Exported {count} row(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
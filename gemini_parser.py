@@ -1,136 +1,480 @@
 import google.generativeai as genai
 from datetime import datetime
+import asyncio
 import json
 import re
 from config import Config
+from ledger import COLUMNS as LEDGER_COLUMNS
+from expense import Expense
+from batching import MicroBatcher
+from parse_cache import ParseCache
+from rule_parser import RuleParser, AMOUNT_RE
+from json_stream import JsonArrayStreamer
+from item_memory import ItemMemory
+from hedging import Hedger
+from scheduler import GeminiScheduler, estimate_tokens, INTERACTIVE, BULK, PROMPT_OVERHEAD
 
 genai.configure(api_key=Config.GEMINI_API_KEY)
 
+CATEGORIES = ["Food", "Shopping", "Travel", "Entertainment", "Bills", "Healthcare", "Groceries", "Other"]
+PAYMENT_MODES = ["UPI", "Cash", "Card", "Unknown"]
+
+# Numbers the fallback parser doesn't take for prices: dates ("5 march",
+# "march 2026"), durations ("28 days") and quantities ("3 shirts for 1500")
+MONTHS = r'(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)'
+NOT_AMOUNT_BEFORE_RE = re.compile(rf'\b{MONTHS}\s*$')
+NOT_AMOUNT_AFTER_RE = re.compile(
+    rf'^\s*(?:{MONTHS}\b|(?:days?|weeks?|months?|years?|yrs?|hours?|hrs?|mins?|minutes?|pm|am)\b'
+    r'|[a-z]+(?:\s+[a-z]+)?\s+(?:for|at|@)\s*(?:₹|rs\.?|inr)?\s*\d)'
+)
+
+# Sheet columns Gemini fills in; raw_message and timestamp are stamped locally
+MODEL_FIELDS = [c for c in LEDGER_COLUMNS if c not in ('raw_message', 'timestamp')]
+
+EXPENSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "date": {"type": "string", "description": "YYYY-MM-DD"},
+        "amount": {"type": "number"},
+        "currency": {"type": "string"},
+        "category": {"type": "string", "enum": CATEGORIES},
+        "sub_category": {"type": "string"},
+        "item": {"type": "string"},
+        "vendor": {"type": "string"},
+        "payment_mode": {"type": "string", "enum": PAYMENT_MODES},
+        "notes": {"type": "string"},
+    },
+    "required": MODEL_FIELDS,
+}
+
+EXPENSES_SCHEMA = {"type": "array", "items": EXPENSE_SCHEMA}
+
+BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"id": {"type": "string"}, "expenses": EXPENSES_SCHEMA},
+        "required": ["id", "expenses"],
+    },
+}
+
+ITEM_STOPWORDS = {'spent', 'on', 'from', 'rupees', 'rs', 'the', 'a', 'an', 'for', 'to', 'my', 'home'}
+
 class ExpenseParser:
     def __init__(self):
         self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # Caps in-flight Gemini calls; extra parses wait here instead of piling up
+        self._semaphore = asyncio.Semaphore(Config.GEMINI_MAX_CONCURRENCY)
+        # Shares the RPM/TPM quota fairly between users; over budget -> fallback parser
+        self.scheduler = GeminiScheduler()
+        # Re-sends calls slower than the recent p95 and takes whichever copy answers first
+        self.hedger = Hedger()
+        # Repeated messages ("chai 20") are answered without calling Gemini
+        self.cache = ParseCache()
+        # Compiled keyword matcher shared by the fast path and the fallback parser
+        self.rules = RuleParser()
+        # What each user's past items were categorized as; attach() a ledger to seed it
+        self.memory = ItemMemory()
+        # Counters for how each message got parsed (fallback rate = fallbacks / llm_calls)
+        self.stats = {'llm_calls': 0, 'json_errors': 0, 'invalid_items': 0, 'fallbacks': 0,
+                      'memory_hits': 0, 'deadline_fallbacks': 0, 'late_fixups': 0}
+        # Gemini parses still running after their message was answered by the fallback
+        self._late = set()
+        # Gemini-bound messages arriving within the window go out as one request
+        self._batcher = MicroBatcher(
+            self._parse_batch,
+            max_size=Config.GEMINI_BATCH_MAX_SIZE,
+            max_delay=Config.GEMINI_BATCH_WINDOW,
+        )
         
     def create_prompt(self, user_message: str) -> str:
         today = datetime.now().strftime("%Y-%m-%d")
-        return f"""You are an expense extraction AI. Extract ALL expenses from this message.
-
-Today's date: {today}
-User message: "{user_message}"
-
-If there are MULTIPLE expenses, return a JSON array with multiple objects.
-If there is ONE expense, still return an array with one object.
-
-Return ONLY valid JSON array (no markdown, no explanation):
-
-[
-  {{
-    "date": "{today}",
-    "amount": <number>,
-    "currency": "INR",
-    "category": "<Food|Shopping|Travel|Entertainment|Bills|Healthcare|Groceries|Other>",
-    "sub_category": "<specific type>",
-    "item": "<product/service name only>",
-    "vendor": "<platform name or Unknown>",
-    "payment_mode": "<UPI|Cash|Card|Unknown>",
-    "notes": "<brief context>"
-  }}
-]
-
-IMPORTANT RULES:
-1. Extract EVERY expense amount mentioned (300, 200, 100, etc.)
-2. Match each amount with its context (groceries, phone accessories, petrol)
-3. Category mapping:
-   - Groceries/vegetables/food items → "Groceries" or "Food"
-   - Phone/mobile/electronics → "Shopping"
-   - Petrol/fuel/diesel → "Travel"
-   - Clothes/shoes → "Shopping"
-   - Medicine/doctor → "Healthcare"
-4. Item should be SHORT: "groceries", "phone accessories", "petrol", NOT full sentence
-5. Return array even for single expense
-
-Examples:
-
-Input: "Spent 300 for groceries and 200 for phone accessories"
-Output: [
-  {{"date":"{today}","amount":300,"currency":"INR","category":"Groceries","sub_category":"Home groceries","item":"groceries","vendor":"Unknown","payment_mode":"Unknown","notes":"Home groceries"}},
-  {{"date":"{today}","amount":200,"currency":"INR","category":"Shopping","sub_category":"Mobile accessories","item":"phone accessories","vendor":"Unknown","payment_mode":"Unknown","notes":"Mobile accessories"}}
-]
-
-Input: "Bought pizza from Swiggy for 500"
-Output: [
-  {{"date":"{today}","amount":500,"currency":"INR","category":"Food","sub_category":"Pizza","item":"pizza","vendor":"Swiggy","payment_mode":"Unknown","notes":"Food delivery"}}
-]
-
-Now parse: "{user_message}"
-Return JSON array:"""
-
-    async def parse_expense(self, message: str) -> list:
-        """Returns list of expense dicts"""
+        return f"""Extract ALL expenses from the user message (today is {today}).
+
+Rules:
+1. One object per amount mentioned, matched with its own context
+2. Category hints: groceries/vegetables → Groceries; phone/electronics/clothes/shoes → Shopping; petrol/fuel/cab → Travel; medicine/doctor → Healthcare
+3. item is SHORT ("groceries", "phone accessories"), never the full sentence
+4. vendor is the platform name or "Unknown"; date is {today} unless the message says otherwise
+
+User message: {json.dumps(user_message, ensure_ascii=False)}"""
+
+    def create_batch_prompt(self, messages: list) -> str:
+        """One prompt for several users' messages; results are keyed by message id"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        payload = json.dumps(
+            [{"id": f"m{i}", "message": message} for i, message in enumerate(messages, 1)],
+            ensure_ascii=False,
+        )
+        return f"""Extract ALL expenses from EACH message below (today is {today}).
+Return one entry per message id; never mix expenses between ids; use an empty list if a message has no expense.
+
+Rules:
+1. One object per amount mentioned, matched with its own context
+2. Category hints: groceries/vegetables → Groceries; phone/electronics/clothes/shoes → Shopping; petrol/fuel/cab → Travel; medicine/doctor → Healthcare
+3. item is SHORT ("groceries", "phone accessories"), never the full sentence
+4. vendor is the platform name or "Unknown"; date is {today} unless the message says otherwise
+
+Messages: {payload}"""
+
+    @staticmethod
+    def _generation_config(schema: dict, max_output_tokens: int):
+        return genai.types.GenerationConfig(
+            temperature=0.2,
+            max_output_tokens=max_output_tokens,
+            response_mime_type="application/json",
+            response_schema=schema,
+        )
+
+    async def _generate(self, prompt: str, schema: dict = EXPENSES_SCHEMA,
+                        max_output_tokens: int = 2000) -> str:
+        """Run one non-blocking Gemini call under the concurrency cap and timeout.
+
+        The reply is constrained to `schema`, so it is plain JSON with no
+        fences to strip. Cancelling the awaiting task (e.g. an abandoned
+        update) cancels the underlying request as well. A call slower than
+        usual is hedged with a second copy when there is spare budget.
+        """
+        self.stats['llm_calls'] += 1
+        return await self.hedger.run(
+            lambda: self._call(prompt, schema, max_output_tokens),
+            kind='batch' if schema is BATCH_SCHEMA else 'single',
+            can_hedge=lambda: self.scheduler.try_admit(estimate_tokens(prompt, prompt_overhead=0)),
+        )
+
+    async def _call(self, prompt: str, schema: dict, max_output_tokens: int) -> str:
+        async with self._semaphore:
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(
+                    prompt,
+                    generation_config=self._generation_config(schema, max_output_tokens),
+                ),
+                timeout=Config.GEMINI_TIMEOUT,
+            )
+        return response.text
+
+    async def _stream_objects(self, prompt: str):
+        """Stream a Gemini reply, yielding each array element as soon as it closes.
+
+        GEMINI_TIMEOUT applies to the first response and to every gap
+        between chunks, not to the whole stream.
+        """
+        self.stats['llm_calls'] += 1
+        streamer = JsonArrayStreamer()
+        async with self._semaphore:
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(
+                    prompt,
+                    generation_config=self._generation_config(EXPENSES_SCHEMA, 2000),
+                    stream=True,
+                ),
+                timeout=Config.GEMINI_TIMEOUT,
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=Config.GEMINI_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                try:
+                    objects = streamer.feed(chunk.text)
+                except json.JSONDecodeError:
+                    self.stats['json_errors'] += 1
+                    raise
+                for obj in objects:
+                    yield obj
+
+    def _loads(self, text: str):
         try:
-            prompt = self.create_prompt(message)
-            
-            # Generate with Gemini
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.2,
-                    max_output_tokens=2000,
-                )
+            return json.loads(text)
+        except json.JSONDecodeError:
+            self.stats['json_errors'] += 1
+            print(f"❌ Text: {text[:500]}")
+            raise
+
+    async def _parse_single(self, message: str) -> list:
+        """Parse one message with its own Gemini call"""
+        text = await self._generate(self.create_prompt(message))
+        print(f"📝 Gemini response: {text[:500]}")
+        
+        expenses_array = self._loads(text)
+        if not isinstance(expenses_array, list):
+            expenses_array = [expenses_array]
+        return expenses_array
+
+    async def _parse_batch(self, messages: list, refund: bool = True) -> list:
+        """Micro-batch flush: parse messages from concurrent users in one call.
+
+        Returns one expense list per message. A batch of one isn't sent and
+        gets [None] (the caller makes its own call); messages a sent batch
+        couldn't answer get False (retrying them needs budget again).
+        """
+        if len(messages) == 1:
+            return [None]
+        
+        if refund:
+            # Each message was admitted as one request; the batch only uses one
+            self.scheduler.adjust(requests=-(len(messages) - 1))
+        try:
+            max_tokens = min(2000 * len(messages), 8192)
+            text = await self._generate(
+                self.create_batch_prompt(messages), schema=BATCH_SCHEMA, max_output_tokens=max_tokens
             )
-            
-            # Extract and clean text
-            text = response.text.strip()
-            
-            # Remove markdown formatting
-            text = re.sub(r'```json\s*', '', text)
-            text = re.sub(r'```\s*', '', text)
-            text = re.sub(r'^\s*json\s*', '', text, flags=re.IGNORECASE)
-            text = text.strip()
-            
-            # Find JSON array
-            array_match = re.search(r'\[.*\]', text, re.DOTALL)
-            if array_match:
-                text = array_match.group(0)
-            
-            print(f"📝 Gemini response: {text[:500]}")
-            
-            # Parse JSON array
-            expenses_array = json.loads(text)
-            
-            # Ensure it's a list
-            if not isinstance(expenses_array, list):
-                expenses_array = [expenses_array]
-            
-            # Add metadata to each expense
-            timestamp = datetime.now().isoformat()
-            for expense in expenses_array:
-                expense['raw_message'] = message
-                expense['timestamp'] = timestamp
-                
-                # Clean item field
-                if 'item' in expense:
-                    item = str(expense['item']).lower()
-                    words_to_remove = ['spent', 'on', 'from', 'rupees', 'rs', 'the', 'a', 'an', 'for', 'to', 'my', 'home']
-                    item_words = [w for w in item.split() if w not in words_to_remove]
-                    expense['item'] = ' '.join(item_words)[:50] if item_words else item[:50]
-            
-            print(f"✅ Parsed {len(expenses_array)} expense(s)")
-            for i, exp in enumerate(expenses_array, 1):
-                print(f"  {i}. ₹{exp.get('amount')} - {exp.get('item')} ({exp.get('category')})")
-            
-            return expenses_array
+            results = {
+                str(entry.get('id')): entry.get('expenses')
+                for entry in self._loads(text)
+                if isinstance(entry, dict)
+            }
+        except Exception as e:
+            print(f"❌ Batch of {len(messages)} failed: {type(e).__name__}: {e}")
+            return [False] * len(messages)
+        
+        print(f"📦 Parsed batch of {len(messages)} message(s) in one call")
+        parsed = []
+        for i in range(1, len(messages) + 1):
+            expenses = results.get(f"m{i}")
+            parsed.append(expenses if isinstance(expenses, list) else False)
+        return parsed
+
+    def _validate(self, raw, message: str, today: str, timestamp: str):
+        """Coerce one model object into a clean Expense, or None if unusable"""
+        if not isinstance(raw, dict):
+            return None
+        try:
+            amount = float(raw.get('amount'))
+        except (TypeError, ValueError):
+            return None
+        
+        item = str(raw.get('item') or '').lower()
+        item_words = [w for w in item.split() if w not in ITEM_STOPWORDS]
+        category = raw.get('category')
+        payment_mode = raw.get('payment_mode')
+        date = str(raw.get('date') or today)
+        
+        return Expense.from_dict({
+            "date": date if re.fullmatch(r'\d{4}-\d{2}-\d{2}', date) else today,
+            "amount": amount,
+            "currency": str(raw.get('currency') or Config.DEFAULT_CURRENCY),
+            "category": category if category in CATEGORIES else "Other",
+            "sub_category": str(raw.get('sub_category') or ''),
+            "item": ' '.join(item_words)[:50] if item_words else item[:50],
+            "vendor": str(raw.get('vendor') or 'Unknown'),
+            "payment_mode": payment_mode if payment_mode in PAYMENT_MODES else "Unknown",
+            "notes": str(raw.get('notes') or ''),
+            "raw_message": message,
+            "timestamp": timestamp,
+        })
+
+    def _finalize(self, message: str, expenses_array: list) -> list:
+        """Validate model output into Expenses in one pass, adding metadata"""
+        now = datetime.now()
+        today, timestamp = now.strftime("%Y-%m-%d"), now.isoformat()
+        expenses = []
+        for raw in expenses_array:
+            expense = self._validate(raw, message, today, timestamp)
+            if expense is None:
+                self.stats['invalid_items'] += 1
+                continue
+            expenses.append(expense)
+        
+        print(f"✅ Parsed {len(expenses)} expense(s)")
+        for i, exp in enumerate(expenses, 1):
+            print(f"  {i}. ₹{exp.amount} - {exp.item} ({exp.category})")
+        return expenses
+
+    def _parse_local(self, message: str, user_id: int = None):
+        """Cache hit, high-confidence rule parse or remembered item, or None if Gemini is needed"""
+        cached = self.cache.get(message)
+        if cached is not None:
+            return cached
+        
+        # Simple "amount + item" messages are parsed locally
+        expenses, confidence = self.rules.parse(message)
+        if confidence >= Config.RULE_CONFIDENCE_THRESHOLD:
+            print(f"⚡ Rule parser ({confidence:.2f}): {message}")
+            return expenses
+        
+        # Items this user has logged before ("chai at tapri 20" after "chai 20")
+        remembered = self.memory.parse(message, user_id, self.rules.extract_vendor(message))
+        if remembered is not None:
+            self.stats['memory_hits'] += 1
+            print(f"🧠 Item memory: {message}")
+        return remembered
+
+    async def _admit(self, message: str, user_id) -> bool:
+        """Wait for Gemini budget; short messages are interactive, long dumps bulk"""
+        amounts = len(AMOUNT_RE.findall(message))
+        interactive = amounts <= 2 and len(message) <= Config.GEMINI_INTERACTIVE_MAX_CHARS
+        granted = await self.scheduler.admit(
+            user_id, estimate_tokens(message, amounts), INTERACTIVE if interactive else BULK
+        )
+        if not granted:
+            print(f"🚦 Gemini budget exhausted ({len(self.scheduler)} queued)")
+        return granted
+
+    def _cache_result(self, message: str, expenses: list):
+        # Only cache results that don't depend on a date mentioned in the message
+        today = datetime.now().date().toordinal()
+        if expenses and all(exp.day == today for exp in expenses):
+            self.cache.put(message, expenses)
+
+    async def parse_expense_stream(self, message: str, user_id: int = None, on_late=None):
+        """Async generator of Expenses, each yielded as soon as it is parsed.
+
+        Long multi-expense messages are streamed from Gemini so the first
+        expense is ready before the full reply; everything else goes through
+        parse_expense (see there for on_late) and is yielded in one go.
+        """
+        local = self._parse_local(message, user_id)
+        min_amounts = Config.GEMINI_STREAM_MIN_AMOUNTS
+        if local is not None or not min_amounts or len(AMOUNT_RE.findall(message)) < min_amounts:
+            if local is None:
+                local = await self.parse_expense(message, user_id, on_late)
+            for expense in local:
+                yield expense
+            return
+        
+        if not await self._admit(message, user_id):
+            for expense in self._fallback_parser(message):
+                yield expense
+            return
+        
+        now = datetime.now()
+        today, timestamp = now.strftime("%Y-%m-%d"), now.isoformat()
+        expenses = []
+        try:
+            async for raw in self._stream_objects(self.create_prompt(message)):
+                expense = self._validate(raw, message, today, timestamp)
+                if expense is None:
+                    self.stats['invalid_items'] += 1
+                    continue
+                expenses.append(expense)
+                yield expense
+        except Exception as e:
+            print(f"❌ Stream error after {len(expenses)} expense(s): {type(e).__name__}: {e}")
+            # Amounts the stream didn't get to are taken from the fallback parser
+            streamed = [exp.amount for exp in expenses]
+            for expense in self._fallback_parser(message, split=True):
+                if expense.amount in streamed:
+                    streamed.remove(expense.amount)
+                    continue
+                yield expense
+            return
+        
+        print(f"✅ Streamed {len(expenses)} expense(s)")
+        self._cache_result(message, expenses)
+        self.memory.learn(user_id, expenses)
+
+    async def _parse_remote(self, message: str, user_id) -> list:
+        # Messages arriving together share one Gemini request
+        expenses_array = await self._batcher.submit(message)
+        if expenses_array is False:
+            # The batch used this message's request; retrying on its own needs budget again
+            if not await self._admit(message, user_id):
+                return self._fallback_parser(message)
+            expenses_array = None
+        if expenses_array is None:
+            expenses_array = await self._parse_single(message)
+        
+        expenses_array = self._finalize(message, expenses_array)
+        self._cache_result(message, expenses_array)
+        self.memory.learn(user_id, expenses_array)
+        return expenses_array
+
+    def _late_result(self, task: asyncio.Task, message: str, on_late):
+        """Gemini answered a message after the fallback parser did"""
+        self._late.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            return
+        print(f"🐢 Late Gemini answer: {message}")
+        if on_late is not None:
+            self.stats['late_fixups'] += 1
+            fixup = asyncio.ensure_future(on_late(task.result()))
+            self._late.add(fixup)
+            fixup.add_done_callback(self._late.discard)
+
+    async def parse_expense(self, message: str, user_id: int = None, on_late=None) -> list:
+        """Returns list of Expenses.
+        
+        If Gemini hasn't answered within GEMINI_DEADLINE, the fallback
+        parser answers instead; Gemini's result is still cached and, when
+        it arrives, passed to the `on_late` coroutine function (to correct
+        whatever was saved from the fallback).
+        """
+        local = self._parse_local(message, user_id)
+        if local is not None:
+            return local
+        
+        if not await self._admit(message, user_id):
+            return self._fallback_parser(message)
+        
+        task = asyncio.ensure_future(self._parse_remote(message, user_id))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=Config.GEMINI_DEADLINE or None)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if not done:
+            print(f"⏱️ No Gemini answer within {Config.GEMINI_DEADLINE}s, using the fallback parser")
+            self.stats['deadline_fallbacks'] += 1
+            self._late.add(task)
+            task.add_done_callback(lambda t: self._late_result(t, message, on_late))
+            return self._fallback_parser(message)
+        
+        try:
+            return task.result()
             
         except json.JSONDecodeError as e:
             print(f"❌ JSON error: {e}")
-            print(f"❌ Text: {text[:500]}")
+            return self._fallback_parser(message)
+            
+        except asyncio.TimeoutError:
+            print(f"⏱️ Gemini timed out after {Config.GEMINI_TIMEOUT}s")
             return self._fallback_parser(message)
             
         except Exception as e:
             print(f"❌ Error: {type(e).__name__}: {e}")
             return self._fallback_parser(message)
     
-    def _fallback_parser(self, message: str) -> list:
-        """Smart fallback - extracts multiple expenses"""
+    async def parse_bulk(self, messages: list, user_id: int = None) -> list:
+        """Parse a chunk of imported lines in one Gemini call; one Expense list per line.
+        
+        The chunk is admitted as a single bulk request. Lines the batch
+        can't answer, and the whole chunk when the budget is exhausted, go
+        to the fallback parser rather than to individual retries.
+        """
+        # The instructions are sent once per chunk, not once per line
+        tokens = PROMPT_OVERHEAD + sum(
+            estimate_tokens(m, len(AMOUNT_RE.findall(m)), prompt_overhead=10) for m in messages
+        )
+        results = [None] * len(messages)
+        if await self.scheduler.admit(user_id, tokens, BULK):
+            try:
+                if len(messages) == 1:
+                    results = [await self._parse_single(messages[0])]
+                else:
+                    results = await self._parse_batch(messages, refund=False)
+            except Exception as e:
+                print(f"❌ Bulk chunk of {len(messages)} failed: {type(e).__name__}: {e}")
+        
+        parsed = []
+        for message, raw in zip(messages, results):
+            if not isinstance(raw, list):
+                parsed.append(self._fallback_parser(message))
+                continue
+            expenses = self._finalize(message, raw)
+            self.memory.learn(user_id, expenses)
+            parsed.append(expenses)
+        return parsed
+    
+    def _fallback_parser(self, message: str, split: bool = False) -> list:
+        """Smart fallback - extracts multiple expenses.
+        
+        Without "<amount> for <thing>" phrases only the first amount is
+        used, unless split is set (recovering a failed stream): then every
+        amount becomes an expense, described by the words next to it.
+        """
+        self.stats['fallbacks'] += 1
         print(f"⚠️ Using fallback parser for: {message}")
         
         expenses = []
@@ -151,124 +495,79 @@ Return JSON array:"""
             # Determine category and item from context
             category, sub_category, item = self._categorize_from_context(context)
             
-            expense = {
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "amount": amount,
-                "currency": Config.DEFAULT_CURRENCY,
-                "category": category,
-                "sub_category": sub_category,
-                "item": item,
-                "vendor": self._extract_vendor(context),
-                "payment_mode": "Unknown",
-                "notes": context[:100],
-                "raw_message": message,
-                "timestamp": datetime.now().isoformat(),
-            }
+            expense = Expense(
+                amount=amount,
+                category=category,
+                sub_category=sub_category,
+                item=item,
+                vendor=self._extract_vendor(context),
+                notes=context[:100],
+                raw_message=message,
+            )
             expenses.append(expense)
         
-        # If no pattern match, try simple amount extraction
+        # If no pattern match, use the first amount (or each amount when splitting)
         if not found_any:
-            amounts = re.findall(r'\b(\d+)\b', message)
-            if amounts:
-                amount = float(amounts[0])
-                category, sub_category, item = self._categorize_from_context(message_lower)
+            amounts = [m for m in AMOUNT_RE.finditer(message_lower) if self._is_amount(message_lower, m)]
+            pairs = self._split_amounts(message_lower, amounts)
+            if not split:
+                pairs = [(match, message_lower) for match, _ in pairs[:1]]
+            for match, context in pairs:
+                category, sub_category, item = self._categorize_from_context(context)
                 
-                expense = {
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "amount": amount,
-                    "currency": Config.DEFAULT_CURRENCY,
-                    "category": category,
-                    "sub_category": sub_category,
-                    "item": item,
-                    "vendor": self._extract_vendor(message_lower),
-                    "payment_mode": "Unknown",
-                    "notes": message[:100],
-                    "raw_message": message,
-                    "timestamp": datetime.now().isoformat(),
-                }
+                expense = Expense(
+                    amount=float(match.group(1)),
+                    category=category,
+                    sub_category=sub_category,
+                    item=item,
+                    vendor=self._extract_vendor(context),
+                    notes=message[:100],
+                    raw_message=message,
+                )
                 expenses.append(expense)
         
         return expenses if expenses else [self._default_expense(message)]
     
+    @staticmethod
+    def _is_amount(text: str, match) -> bool:
+        """False for numbers that are part of a date, a duration or a quantity"""
+        return not (NOT_AMOUNT_BEFORE_RE.search(text[:match.start()])
+                    or NOT_AMOUNT_AFTER_RE.match(text[match.end():]))
+    
+    @staticmethod
+    def _split_amounts(text: str, amounts: list) -> list:
+        """(amount match, context) per expense: the words before each amount
+        ("lunch 250 and coffee 90"), or after it if the message starts with an
+        amount ("250 lunch, 90 coffee"; but "2 chai 30" is a quantity)"""
+        leading = (bool(amounts) and not text[:amounts[0].start()].strip()
+                   and bool(text[amounts[-1].end():].strip()))
+        pairs = []
+        for i, match in enumerate(amounts):
+            if leading:
+                end = amounts[i + 1].start() if i + 1 < len(amounts) else len(text)
+                context = text[match.end():end]
+            else:
+                context = text[amounts[i - 1].end() if i else 0:match.start()]
+            context = re.sub(r'^[\s,;&.-]*(?:and\b)?|[\s,;&.-]+$', '', context)
+            if not context and not leading and len(amounts) > 1:
+                continue
+            pairs.append((match, context or text))
+        return pairs
+    
     def _categorize_from_context(self, context: str) -> tuple:
         """Returns (category, sub_category, item)"""
-        context = context.lower()
-        
-        # Groceries
-        grocery_keywords = ['grocery', 'groceries', 'vegetables', 'fruits', 'ration', 'provisions']
-        if any(kw in context for kw in grocery_keywords):
-            return ("Groceries", "Home groceries", "groceries")
-        
-        # Travel/Fuel
-        travel_keywords = ['petrol', 'diesel', 'fuel', 'gas', 'uber', 'ola', 'taxi', 'auto', 'metro', 'bus']
-        for kw in travel_keywords:
-            if kw in context:
-                return ("Travel", kw.title(), kw)
-        
-        # Shopping/Electronics
-        electronics = ['phone', 'mobile', 'laptop', 'charger', 'headphone', 'earphone', 'cable', 'accessory', 'accessories']
-        if any(kw in context for kw in electronics):
-            return ("Shopping", "Electronics", self._extract_item_name(context, electronics))
-        
-        # Clothing
-        clothing = ['jeans', 'shirt', 'tshirt', 't-shirt', 'shoes', 'pants', 'dress', 'clothes']
-        if any(kw in context for kw in clothing):
-            return ("Shopping", "Clothing", self._extract_item_name(context, clothing))
-        
-        # Food
-        food_keywords = ['pizza', 'burger', 'biryani', 'food', 'lunch', 'dinner', 'breakfast', 'snacks', 'coffee', 'tea']
-        if any(kw in context for kw in food_keywords):
-            return ("Food", "Restaurant/Delivery", self._extract_item_name(context, food_keywords))
-        
-        # Healthcare
-        health_keywords = ['medicine', 'doctor', 'hospital', 'pharmacy', 'medical', 'clinic']
-        if any(kw in context for kw in health_keywords):
-            return ("Healthcare", "Medical", self._extract_item_name(context, health_keywords))
-        
-        # Bills
-        bill_keywords = ['electricity', 'water', 'internet', 'mobile bill', 'recharge', 'broadband']
-        if any(kw in context for kw in bill_keywords):
-            return ("Bills", "Utility", self._extract_item_name(context, bill_keywords))
-        
-        return ("Other", "Miscellaneous", context[:30])
-    
-    def _extract_item_name(self, context: str, keywords: list) -> str:
-        """Extract the most relevant item name"""
-        for kw in keywords:
-            if kw in context:
-                return kw
-        # Return first meaningful word
-        words = context.split()
-        return words[0] if words else "item"
+        return self.rules.categorize(context)
     
     def _extract_vendor(self, context: str) -> str:
         """Extract vendor/platform name"""
-        vendors = {
-            'swiggy': 'Swiggy', 'zomato': 'Zomato',
-            'uber': 'Uber', 'ola': 'Ola',
-            'amazon': 'Amazon', 'flipkart': 'Flipkart',
-            'myntra': 'Myntra', 'ajio': 'Ajio',
-            'bigbasket': 'BigBasket', 'blinkit': 'Blinkit',
-            'zepto': 'Zepto', 'dunzo': 'Dunzo',
-        }
-        
-        for key, name in vendors.items():
-            if key in context:
-                return name
-        return "Unknown"
+        return self.rules.extract_vendor(context)
     
-    def _default_expense(self, message: str) -> dict:
+    def _default_expense(self, message: str) -> Expense:
         """Return default expense when all parsing fails"""
-        return {
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "amount": 0,
-            "currency": Config.DEFAULT_CURRENCY,
-            "category": "Other",
-            "sub_category": "Needs review",
-            "item": "unspecified",
-            "vendor": "Unknown",
-            "payment_mode": "Unknown",
-            "notes": message[:100],
-            "raw_message": message,
-            "timestamp": datetime.now().isoformat(),
-        }
+        return Expense(
+            amount=0,
+            sub_category="Needs review",
+            item="unspecified",
+            notes=message[:100],
+            raw_message=message,
+        )
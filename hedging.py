@@ -0,0 +1,89 @@
+import asyncio
+import time
+from collections import deque
+from config import Config
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies (seconds)"""
+
+    def __init__(self, window: int = None):
+        self.samples = deque(maxlen=window or Config.GEMINI_HEDGE_WINDOW)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        """q-th percentile (0-1) of the window, or None while it is empty"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Hedger:
+    """Races a second copy of a slow call against the first.
+
+    If a call hasn't returned by the tracked latency percentile for its
+    kind (p95 by default), the same call is started again and whichever
+    succeeds first wins; the other is cancelled. Hedging only starts once
+    MIN_SAMPLES latencies are known, and only when `can_hedge()` allows
+    it (e.g. there is spare quota).
+    """
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, percentile: float = None, min_delay: float = None):
+        self.percentile = Config.GEMINI_HEDGE_PERCENTILE if percentile is None else percentile
+        self.min_delay = Config.GEMINI_HEDGE_MIN_DELAY if min_delay is None else min_delay
+        self.trackers = {}   # kind -> LatencyTracker
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0}
+
+    def delay(self, kind: str = None) -> float:
+        """Seconds to wait before hedging a call of this kind (None = don't hedge)"""
+        tracker = self.trackers.get(kind)
+        if not self.percentile or tracker is None or len(tracker.samples) < self.MIN_SAMPLES:
+            return None
+        return max(self.min_delay, tracker.percentile(self.percentile))
+
+    async def _timed(self, call, kind: str):
+        started = time.monotonic()
+        result = await call()
+        self.trackers.setdefault(kind, LatencyTracker()).record(time.monotonic() - started)
+        return result
+
+    async def run(self, call, kind: str = None, can_hedge=None):
+        """Await call() (a coroutine function), hedging it if it runs long"""
+        self.stats['calls'] += 1
+        primary = asyncio.ensure_future(self._timed(call, kind))
+        tasks = {primary}
+        try:
+            delay = self.delay(kind)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and (can_hedge is None or can_hedge()):
+                    self.stats['hedged'] += 1
+                    tasks.add(asyncio.ensure_future(self._timed(call, kind)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats['hedge_wins'] += 1
+                        return task.result()
+                    # The first failure is reported only if the other copy fails too
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.stats['hedged'] / self.stats['calls'] if self.stats['calls'] else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.stats['hedge_wins'] / self.stats['hedged'] if self.stats['hedged'] else 0.0
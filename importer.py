@@ -0,0 +1,181 @@
+import csv
+import time
+from datetime import date
+from config import Config
+from ledger import _normalize_date, _to_float
+from rule_parser import AMOUNT_RE
+
+# Header keywords for the columns of common bank / UPI statement exports
+DATE_HEADERS = ('date',)
+DEBIT_HEADERS = ('debit', 'withdrawal', 'dr amount')
+CREDIT_HEADERS = ('credit', 'deposit', 'cr amount')
+# Too generic to match inside longer headers ("Paid To", "Received From"): whole names only
+DEBIT_NAMES = ('paid', 'amount paid', 'paid amount')
+CREDIT_NAMES = ('received', 'amount received', 'received amount')
+AMOUNT_HEADERS = ('amount',)
+TYPE_HEADERS = ('type', 'dr/cr', 'cr/dr')
+DESCRIPTION_HEADERS = ('description', 'narration', 'particulars', 'remarks', 'details',
+                       'merchant', 'payee', 'paid to', 'note')
+
+
+def _find_column(headers: list, keywords: tuple, names: tuple = ()):
+    for i, header in enumerate(headers):
+        if header in names or any(kw in header for kw in keywords):
+            return i
+    return None
+
+
+class StatementImporter:
+    """Streams a CSV statement or a text file (one expense per line) into the sheet.
+
+    Rows are read one at a time. Lines the rule parser is confident about
+    are categorized locally, the rest are sent to Gemini in chunks of
+    IMPORT_GEMINI_CHUNK, and expenses are queued to the spool in chunks
+    of IMPORT_WRITE_CHUNK, so memory stays bounded by the chunk sizes
+    whatever the file length.
+    """
+
+    def __init__(self, parser, sheets, user_id: int = None, chat_id: int = None, progress=None):
+        self.parser = parser
+        self.sheets = sheets
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.progress = progress        # async fn(stats), called at most every REPLY_EDIT_INTERVAL
+        self.stats = {'lines': 0, 'imported': 0, 'rules': 0, 'gemini': 0, 'skipped': 0, 'failed': 0}
+        self._ambiguous = []            # (message, statement day or None, amount or None)
+        self._ready = []                # Expenses waiting to be written
+        self._last_progress = 0.0
+
+    async def run(self, path: str) -> dict:
+        with open(path, encoding='utf-8-sig', errors='replace', newline='') as f:
+            sample = f.read(4096)
+            f.seek(0)
+            if self._looks_like_csv(sample):
+                rows = self._csv_rows(f)
+            else:
+                rows = ((line.strip(), None, None) for line in f)
+            
+            for message, day, amount in rows:
+                self.stats['lines'] += 1
+                await self._add(message, day, amount)
+                if len(self._ambiguous) >= Config.IMPORT_GEMINI_CHUNK:
+                    await self._parse_ambiguous()
+                if len(self._ready) >= Config.IMPORT_WRITE_CHUNK:
+                    await self._write()
+                await self._report()
+        
+        await self._parse_ambiguous()
+        await self._write()
+        return self.stats
+
+    @staticmethod
+    def _looks_like_csv(sample: str) -> bool:
+        first_line = sample.split('\n', 1)[0].lower()
+        return ',' in first_line and any(kw in first_line for kw in DATE_HEADERS + AMOUNT_HEADERS + DEBIT_HEADERS)
+
+    def _csv_rows(self, f):
+        """(description, day ordinal, amount) per debit row; credits and blank rows are skipped"""
+        reader = csv.reader(f)
+        headers = [h.strip().lower() for h in next(reader, [])]
+        date_col = _find_column(headers, DATE_HEADERS)
+        debit_col = _find_column(headers, DEBIT_HEADERS, DEBIT_NAMES)
+        credit_col = _find_column(headers, CREDIT_HEADERS, CREDIT_NAMES)
+        amount_col = debit_col if debit_col is not None else _find_column(headers, AMOUNT_HEADERS)
+        type_col = _find_column(headers, TYPE_HEADERS)
+        description_col = _find_column(headers, DESCRIPTION_HEADERS)
+        
+        # A lone signed Amount column (Paytm style "-250" / "+5000"): if any amount
+        # is negative, debits are the negative ones; otherwise only an explicit
+        # "+" marks a credit. Finding out takes one extra streaming pass.
+        negative_debits = False
+        if debit_col is None and type_col is None and amount_col is not None:
+            negative_debits = any(
+                _to_float(row[amount_col]) < 0 for row in reader if amount_col < len(row)
+            )
+            f.seek(0)
+            reader = csv.reader(f)
+            next(reader, None)
+        
+        for row in reader:
+            cell = lambda i: row[i].strip() if i is not None and i < len(row) else ''
+            signed = _to_float(cell(amount_col))
+            amount = abs(signed)
+            is_credit = (
+                (debit_col is not None and not amount and _to_float(cell(credit_col)))
+                or cell(type_col).lower() in ('cr', 'credit')
+                or (negative_debits and signed > 0)
+                or (debit_col is None and type_col is None and cell(amount_col).startswith('+'))
+            )
+            if not amount or is_credit:
+                self.stats['skipped'] += 1
+                continue
+            
+            description = cell(description_col) or ' '.join(
+                c for i, c in enumerate(row) if i not in (date_col, amount_col, credit_col)
+            )
+            day = None
+            normalized = _normalize_date(cell(date_col))
+            try:
+                day = date.fromisoformat(normalized).toordinal()
+            except ValueError:
+                pass
+            yield description, day, amount
+
+    async def _add(self, message: str, day, amount):
+        if not message or (amount is None and not AMOUNT_RE.search(message)):
+            self.stats['skipped'] += 1
+            return
+        
+        if amount is not None:
+            expenses, confidence = self.parser.rules.parse_statement_row(message, amount)
+        else:
+            expenses, confidence = self.parser.rules.parse(message)
+        
+        if confidence >= Config.RULE_CONFIDENCE_THRESHOLD:
+            self.stats['rules'] += 1
+            self._ready.extend(self._stamp(expenses, day, amount))
+        else:
+            self._ambiguous.append((message, day, amount))
+
+    async def _parse_ambiguous(self):
+        if not self._ambiguous:
+            return
+        chunk, self._ambiguous = self._ambiguous, []
+        results = await self.parser.parse_bulk([message for message, _, _ in chunk], self.user_id)
+        self.stats['gemini'] += len(chunk)
+        for (_, day, amount), expenses in zip(chunk, results):
+            self._ready.extend(self._stamp(expenses, day, amount))
+
+    @staticmethod
+    def _stamp(expenses: list, day, amount) -> list:
+        """Statement columns win over whatever was parsed from the description"""
+        if amount is not None:
+            # A statement row is exactly one payment
+            expenses = expenses[:1]
+            for expense in expenses:
+                expense.amount = float(amount)
+        for expense in expenses:
+            if day is not None:
+                expense.day = day
+        return [expense for expense in expenses if expense.amount]
+
+    async def _write(self):
+        if not self._ready:
+            return
+        chunk, self._ready = self._ready, []
+        results = await self.sheets.add_expenses(chunk, user_id=self.user_id, chat_id=self.chat_id)
+        saved = sum(results)
+        self.stats['imported'] += saved
+        self.stats['failed'] += len(chunk) - saved
+
+    async def _report(self):
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        if now - self._last_progress < Config.REPLY_EDIT_INTERVAL:
+            return
+        self._last_progress = now
+        try:
+            await self.progress(dict(self.stats))
+        except Exception as e:
+            print(f"Import progress update failed: {e}")
@@ -0,0 +1,153 @@
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from config import Config
+from expense import Expense
+from rule_parser import AMOUNT_RE, AMBIGUOUS_RE
+
+WORD_RE = re.compile(r'[a-z]+')
+STOPWORDS = {'spent', 'on', 'from', 'rupees', 'rs', 'inr', 'the', 'a', 'an', 'for', 'to',
+             'my', 'at', 'in', 'of', 'paid', 'bought', 'got', 'via', 'by', 'with', 'today'}
+# Largest leading number read as a quantity ("2 chai 30") rather than a price
+MAX_QUANTITY = 20
+
+
+def _words(text: str) -> list:
+    words = []
+    for word in WORD_RE.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        # "chais" and "chai" should share every trigram
+        words.append(word[:-1] if len(word) > 3 and word.endswith('s') else word)
+    return words
+
+
+def _trigrams(text: str) -> frozenset:
+    padded = f" {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class _UserIndex:
+    """One user's learned items with a trigram -> entry inverted index"""
+
+    __slots__ = ('entries', 'by_item', 'postings')
+
+    def __init__(self):
+        self.entries = []           # [item, category, sub_category, vendor, trigram count]
+        self.by_item = {}           # normalized item -> entry id
+        self.postings = defaultdict(set)
+
+    def add(self, item: str, category: str, sub_category: str, vendor: str):
+        key = " ".join(_words(item))
+        if not key:
+            return
+        entry_id = self.by_item.get(key)
+        if entry_id is not None:
+            # The latest categorization of an item wins
+            self.entries[entry_id][1:4] = [category, sub_category, vendor]
+            return
+        grams = _trigrams(key)
+        self.by_item[key] = len(self.entries)
+        self.entries.append([item, category, sub_category, vendor, len(grams)])
+        for gram in grams:
+            self.postings[gram].add(self.by_item[key])
+
+    def best_match(self, words: list) -> tuple:
+        """(entry, similarity) of the learned item most similar to any word or word pair"""
+        best, best_score = None, 0.0
+        phrases = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for phrase in phrases:
+            grams = _trigrams(phrase)
+            shared = defaultdict(int)
+            for gram in grams:
+                for entry_id in self.postings.get(gram, ()):
+                    shared[entry_id] += 1
+            for entry_id, count in shared.items():
+                # Jaccard similarity of the two trigram sets
+                score = count / (len(grams) + self.entries[entry_id][4] - count)
+                if score > best_score:
+                    best, best_score = self.entries[entry_id], score
+        return best, best_score
+
+
+class ItemMemory:
+    """Per-user memory of how past items were categorized.
+
+    Built lazily per user from their most recent ledger rows and extended
+    as new expenses are parsed, so "chai at tapri 20" is categorized like
+    the earlier "chai 20" without asking Gemini. Matching is trigram
+    Jaccard similarity through an inverted index, so a lookup only touches
+    entries that share a trigram with the message.
+    """
+
+    def __init__(self, ledger=None):
+        self.ledger = ledger
+        self._lock = threading.Lock()
+        self._users = OrderedDict()   # user_id -> _UserIndex
+        self.hits = 0
+
+    def attach(self, ledger):
+        """Start loading history from the ledger (it is built after the parser)"""
+        self.ledger = ledger
+        with self._lock:
+            self._users.clear()
+
+    def _index(self, user_id: int) -> _UserIndex:
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                self._users.move_to_end(user_id)
+                return index
+        
+        index = _UserIndex()
+        if self.ledger is not None:
+            for item, category, sub_category, vendor in reversed(
+                self.ledger.item_history(user_id, Config.ITEM_MEMORY_HISTORY)
+            ):
+                if category and category != "Other":
+                    index.add(item, category, sub_category, vendor)
+        with self._lock:
+            self._users[user_id] = index
+            while len(self._users) > Config.ITEM_MEMORY_USERS:
+                self._users.popitem(last=False)
+        return index
+
+    def learn(self, user_id: int, expenses: list):
+        """Remember the categorization of freshly parsed expenses"""
+        if user_id is None:
+            return
+        index = self._index(user_id)
+        for expense in expenses:
+            if expense.category != "Other" and expense.item and expense.item != "unspecified":
+                index.add(expense.item, expense.category, expense.sub_category, expense.vendor)
+
+    def parse(self, message: str, user_id: int, vendor: str = "Unknown"):
+        """[Expense] for a single-amount message resembling a known item, else None"""
+        if user_id is None or AMBIGUOUS_RE.search(message):
+            return None
+        amounts = list(AMOUNT_RE.finditer(message))
+        if (len(amounts) == 2 and not message[:amounts[0].start()].strip()
+                and amounts[0].group(1).isdigit() and int(amounts[0].group(1)) <= MAX_QUANTITY):
+            # "2 chai 30": the price is the number after the item
+            amounts = amounts[1:]
+        if len(amounts) != 1:
+            return None
+        
+        words = _words(AMOUNT_RE.sub(' ', message))
+        if not words:
+            return None
+        entry, score = self._index(user_id).best_match(words)
+        if entry is None or score < Config.ITEM_MEMORY_THRESHOLD:
+            return None
+        
+        self.hits += 1
+        item, category, sub_category, _ = entry[:4]
+        return [Expense(
+            amount=float(amounts[0].group(1)),
+            category=category,
+            sub_category=sub_category,
+            item=item,
+            vendor=vendor,
+            notes=message[:100],
+            raw_message=message,
+        )]
@@ -0,0 +1,53 @@
+import json
+
+
+class JsonArrayStreamer:
+    """Incrementally splits a streamed JSON array into its top-level objects.
+
+    feed() takes the next chunk of text and returns every object of the
+    outer array that closed within it, so callers can act on each one
+    before the rest of the array has arrived.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0          # next index of _buffer to scan
+        self._start = None     # index where the current top-level object began
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        buf = self._buffer
+        objects = []
+
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '[{':
+                self._depth += 1
+                if self._depth == 2 and ch == '{':
+                    self._start = i
+            elif ch in ']}':
+                self._depth -= 1
+                if self._depth == 1 and ch == '}' and self._start is not None:
+                    objects.append(json.loads(buf[self._start:i + 1]))
+                    self._start = None
+
+        # Keep only the unfinished object (if any) in the buffer
+        if self._start is None:
+            self._buffer, self._pos = "", 0
+        else:
+            self._buffer = buf[self._start:]
+            self._pos = len(self._buffer)
+            self._start = 0
+        return objects
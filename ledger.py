@@ -0,0 +1,423 @@
+import sqlite3
+import threading
+from datetime import datetime
+from config import Config
+
+# Sheet column order (see SheetsManager._get_or_create_worksheet)
+COLUMNS = [
+    "date", "amount", "currency", "category", "sub_category",
+    "item", "vendor", "payment_mode", "notes", "raw_message", "timestamp"
+]
+# Column L holds the bot's idempotency key; rows typed into the sheet leave it empty
+ROW_ID_INDEX = len(COLUMNS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    worksheet TEXT NOT NULL,
+    sheet_row INTEGER,
+    row_id TEXT,
+    user_id INTEGER,
+    date TEXT NOT NULL DEFAULT '',
+    amount REAL NOT NULL DEFAULT 0,
+    currency TEXT,
+    category TEXT,
+    sub_category TEXT,
+    item TEXT,
+    vendor TEXT,
+    payment_mode TEXT,
+    notes TEXT,
+    raw_message TEXT,
+    timestamp TEXT,
+    spooled INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date, amount);
+CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses(user_id, date, amount);
+CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses(category, date, amount);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_sheet_row ON expenses(worksheet, sheet_row);
+CREATE TABLE IF NOT EXISTS budgets (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (user_id, category)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    worksheet TEXT PRIMARY KEY,
+    last_row INTEGER NOT NULL,
+    tail_checksum TEXT NOT NULL,
+    verified_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sync_pages (
+    worksheet TEXT NOT NULL,
+    first_row INTEGER NOT NULL,
+    checksum TEXT NOT NULL,
+    PRIMARY KEY (worksheet, first_row)
+);
+"""
+
+# Rows typed into the sheet have no row id: match them by position. They keep
+# the user they were saved for as long as the slot still holds the same
+# expense (same timestamp); otherwise they belong to the shard's user, if any
+UPSERT_SHEET_ROW = f"""
+INSERT INTO expenses (worksheet, sheet_row, row_id, user_id, {', '.join(COLUMNS)})
+VALUES ({', '.join('?' * (4 + len(COLUMNS)))})
+ON CONFLICT(worksheet, sheet_row) DO UPDATE SET
+    {', '.join(f'{c} = excluded.{c}' for c in COLUMNS)},
+    user_id = CASE WHEN expenses.timestamp = excluded.timestamp
+                   THEN COALESCE(expenses.user_id, excluded.user_id) ELSE excluded.user_id END
+"""
+
+# Rows written by the bot are matched by row id wherever they are in the sheet
+UPSERT_BY_ROW_ID = f"""
+INSERT INTO expenses (worksheet, sheet_row, row_id, user_id, {', '.join(COLUMNS)})
+VALUES ({', '.join('?' * (4 + len(COLUMNS)))})
+ON CONFLICT(row_id) DO UPDATE SET
+    worksheet = excluded.worksheet,
+    sheet_row = excluded.sheet_row,
+    user_id = COALESCE(expenses.user_id, excluded.user_id),
+    spooled = 0,
+    {', '.join(f'{c} = excluded.{c}' for c in COLUMNS)}
+"""
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d %b %Y", "%d-%m-%Y"]
+
+
+def _to_float(value) -> float:
+    """Sheet cells may come back as formatted strings ("₹1,200.00")"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    cleaned = str(value).replace(",", "").replace("₹", "").strip()
+    try:
+        return float(cleaned) if cleaned else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _normalize_date(value) -> str:
+    """Store dates as YYYY-MM-DD whatever display format the sheet applied"""
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return text
+
+
+class Ledger:
+    """Local SQLite mirror of the expense sheet, used for all summary queries"""
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.LEDGER_PATH
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.commit()
+
+    def _migrate(self):
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(expenses)")}
+        if 'row_id' not in columns:
+            self.conn.execute("ALTER TABLE expenses ADD COLUMN row_id TEXT")
+        if 'spooled' not in columns:
+            self.conn.execute("ALTER TABLE expenses ADD COLUMN spooled INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_row_id ON expenses(row_id)"
+        )
+        sync_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sync_state)")}
+        if 'verified_at' not in sync_columns:
+            self.conn.execute("ALTER TABLE sync_state ADD COLUMN verified_at REAL NOT NULL DEFAULT 0")
+
+    def _record(self, row: list, worksheet: str, sheet_row, user_id) -> tuple:
+        """(worksheet, sheet_row, row_id, user_id, *COLUMNS) for a sheet row"""
+        values = list(row[:len(COLUMNS)]) + [""] * (len(COLUMNS) - len(row))
+        values[0] = _normalize_date(values[0])
+        values[1] = _to_float(values[1])
+        row_id = str(row[ROW_ID_INDEX]).strip() if len(row) > ROW_ID_INDEX else ""
+        return (worksheet, sheet_row, row_id or None, user_id, *values)
+
+    def add_rows(self, rows: list, worksheet: str, first_sheet_row: int = None,
+                 user_ids: list = None):
+        """Insert rows written by the bot.
+
+        first_sheet_row is where the batch landed in the sheet; leave it None
+        for rows still waiting in the spool. Those are flagged as spooled
+        until mark_synced, so a sync never drops them, whichever worker's
+        spool holds them.
+        """
+        spooled = int(not first_sheet_row)
+        records = []
+        for i, row in enumerate(rows):
+            sheet_row = first_sheet_row + i if first_sheet_row else None
+            user_id = user_ids[i] if user_ids else None
+            records.append(self._record(row, worksheet, sheet_row, user_id) + (spooled,))
+
+        placeholders = ", ".join("?" * (5 + len(COLUMNS)))
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO expenses (worksheet, sheet_row, row_id, user_id, "
+                f"{', '.join(COLUMNS)}, spooled) VALUES ({placeholders})",
+                records,
+            )
+
+    def _free_slot(self, worksheet: str, sheet_row: int, keep_row_id: str = None,
+                   drop_untracked: bool = True):
+        """Make room at a sheet position: rows without a row id there are dropped,
+        bot rows are detached (they get re-placed when their row id shows up)"""
+        if drop_untracked:
+            self.conn.execute(
+                "DELETE FROM expenses WHERE worksheet = ? AND sheet_row = ? AND row_id IS NULL",
+                (worksheet, sheet_row),
+            )
+        self.conn.execute(
+            "UPDATE expenses SET sheet_row = NULL WHERE worksheet = ? AND sheet_row = ? "
+            "AND row_id IS NOT NULL AND row_id IS NOT ?",
+            (worksheet, sheet_row, keep_row_id),
+        )
+
+    def mark_synced(self, worksheet: str, row_ids: list, first_sheet_row: int):
+        """Record where spooled rows landed in the sheet"""
+        with self._lock, self.conn:
+            for i, row_id in enumerate(row_ids):
+                sheet_row = first_sheet_row + i
+                self._free_slot(worksheet, sheet_row, keep_row_id=row_id)
+                self.conn.execute(
+                    "UPDATE expenses SET worksheet = ?, sheet_row = ?, spooled = 0 WHERE row_id = ?",
+                    (worksheet, sheet_row, row_id),
+                )
+
+    def update_rows(self, rows: list):
+        """Overwrite the values of bot rows (matched by their row id), wherever they are"""
+        records = [self._record(row, None, None, None) for row in rows]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"UPDATE expenses SET {', '.join(f'{c} = ?' for c in COLUMNS)} WHERE row_id = ?",
+                [record[4:] + (record[2],) for record in records],
+            )
+
+    def delete_rows(self, row_ids: list):
+        """Forget bot rows (matched by their row id)"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM expenses WHERE row_id = ?", [(row_id,) for row_id in row_ids]
+            )
+
+    def remove_sheet_row(self, worksheet: str, sheet_row: int, row_id: str):
+        """Mirror the deletion of a sheet row: forget it and move the rows below up one"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM expenses WHERE row_id = ?", (row_id,))
+            # Through negative positions, so the unique index never sees two rows in one slot
+            self.conn.execute(
+                "UPDATE expenses SET sheet_row = 1 - sheet_row WHERE worksheet = ? AND sheet_row > ?",
+                (worksheet, sheet_row),
+            )
+            self.conn.execute(
+                "UPDATE expenses SET sheet_row = -sheet_row WHERE worksheet = ? AND sheet_row < 0",
+                (worksheet,),
+            )
+            self.conn.execute(
+                "UPDATE sync_state SET last_row = last_row - 1 WHERE worksheet = ? AND last_row > ?",
+                (worksheet, sheet_row),
+            )
+
+    def sheet_position(self, row_id: str) -> tuple:
+        """(worksheet, sheet_row) of a bot row; sheet_row is None until it lands"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT worksheet, sheet_row FROM expenses WHERE row_id = ?", (row_id,)
+            ).fetchone() or (None, None)
+
+    def upsert_sheet_rows(self, rows: list, worksheet: str, first_sheet_row: int,
+                          user_id: int = None):
+        """Insert or refresh rows read back from the sheet; blank rows clear their slot.
+        
+        user_id is the owner of the whole worksheet (a per-user shard), if known.
+        """
+        with self._lock, self.conn:
+            for i, row in enumerate(rows):
+                sheet_row = first_sheet_row + i
+                if not any(str(cell).strip() for cell in row):
+                    self._free_slot(worksheet, sheet_row)
+                    continue
+                
+                record = self._record(row, worksheet, sheet_row, user_id)
+                row_id = record[2]
+                self._free_slot(worksheet, sheet_row, keep_row_id=row_id, drop_untracked=bool(row_id))
+                self.conn.execute(UPSERT_BY_ROW_ID if row_id else UPSERT_SHEET_ROW, record)
+
+    def truncate_after(self, worksheet: str, last_row: int):
+        """Drop rows that no longer exist in the sheet.
+
+        Rows without a sheet position are dropped too, except spooled ones
+        (still waiting in some worker's spool).
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM expenses WHERE worksheet = ? "
+                "AND (sheet_row > ? OR (sheet_row IS NULL AND row_id IS NULL))",
+                (worksheet, last_row),
+            )
+            self.conn.execute(
+                "DELETE FROM expenses WHERE worksheet = ? AND sheet_row IS NULL AND spooled = 0",
+                (worksheet,),
+            )
+
+    def get_sync_state(self, worksheet: str) -> tuple:
+        """Returns (last_synced_row, tail_checksum); (0, '') if never synced"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT last_row, tail_checksum FROM sync_state WHERE worksheet = ?",
+                (worksheet,),
+            ).fetchone()
+        return row if row else (0, "")
+
+    def set_sync_state(self, worksheet: str, last_row: int, tail_checksum: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO sync_state (worksheet, last_row, tail_checksum) VALUES (?, ?, ?) "
+                "ON CONFLICT(worksheet) DO UPDATE SET "
+                "last_row = excluded.last_row, tail_checksum = excluded.tail_checksum",
+                (worksheet, last_row, tail_checksum),
+            )
+
+    def get_verified_times(self) -> dict:
+        """worksheet -> when (epoch seconds) its last full scan started"""
+        with self._lock:
+            return dict(self.conn.execute("SELECT worksheet, verified_at FROM sync_state"))
+
+    def set_verified(self, worksheets: list, when: float):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE sync_state SET verified_at = ? WHERE worksheet = ?",
+                [(when, worksheet) for worksheet in worksheets],
+            )
+
+    def get_page_checksums(self, worksheet: str) -> dict:
+        """first sheet row -> checksum of every page seen by the last full scan"""
+        with self._lock:
+            return dict(self.conn.execute(
+                "SELECT first_row, checksum FROM sync_pages WHERE worksheet = ?", (worksheet,)
+            ))
+
+    def set_page_checksums(self, worksheet: str, checksums: dict):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM sync_pages WHERE worksheet = ?", (worksheet,))
+            self.conn.executemany(
+                "INSERT INTO sync_pages (worksheet, first_row, checksum) VALUES (?, ?, ?)",
+                [(worksheet, first_row, checksum) for first_row, checksum in checksums.items()],
+            )
+
+    def count(self, worksheet: str = None) -> int:
+        """Number of mirrored rows (optionally for one worksheet)"""
+        query = "SELECT COUNT(*) FROM expenses"
+        params = ()
+        if worksheet is not None:
+            query += " WHERE worksheet = ?"
+            params = (worksheet,)
+        with self._lock:
+            return self.conn.execute(query, params).fetchone()[0]
+
+    def summary(self, date: str, user_id: int = None) -> tuple:
+        """Returns (total, count) for one day, served from the date index"""
+        query = "SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM expenses WHERE date = ?"
+        params = (date,)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params = (date, user_id)
+        with self._lock:
+            total, count = self.conn.execute(query, params).fetchone()
+        return float(total), count
+
+    def fetch_columns(self, user_id: int = None) -> list:
+        """(date, amount, category, vendor, item) rows with an ISO date, for reports"""
+        query = ("SELECT date, amount, category, vendor, item FROM expenses "
+                 "WHERE date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'")
+        params = ()
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params = (user_id,)
+        with self._lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def category_totals(self, start: str, end: str, user_id: int = None) -> list:
+        """(user_id, category, total) per user and category for start..end"""
+        query = ("SELECT user_id, category, SUM(amount) FROM expenses "
+                 "WHERE date BETWEEN ? AND ? AND user_id IS NOT NULL")
+        params = (start, end)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params = (start, end, user_id)
+        with self._lock:
+            return self.conn.execute(query + " GROUP BY user_id, category", params).fetchall()
+
+    def item_history(self, user_id: int, limit: int) -> list:
+        """(item, category, sub_category, vendor) of a user's latest rows, newest first"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT item, category, sub_category, vendor FROM expenses "
+                "WHERE user_id = ? AND item != '' ORDER BY id DESC LIMIT ?",
+                (user_id, limit),
+            ).fetchall()
+
+    def get_budgets(self) -> list:
+        """(user_id, category, amount) for every budget; category '' is the monthly total"""
+        with self._lock:
+            return self.conn.execute("SELECT user_id, category, amount FROM budgets").fetchall()
+
+    def set_budget(self, user_id: int, category: str, amount: float):
+        """Set a budget; an amount of 0 removes it"""
+        with self._lock, self.conn:
+            if amount > 0:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO budgets (user_id, category, amount) VALUES (?, ?, ?)",
+                    (user_id, category, amount),
+                )
+            else:
+                self.conn.execute(
+                    "DELETE FROM budgets WHERE user_id = ? AND category = ?", (user_id, category)
+                )
+
+    def iter_pages(self, user_id: int = None, start: str = None, end: str = None,
+                   category: str = None, page_size: int = 1000):
+        """Yield lists of COLUMNS tuples in insertion order, one page at a time.
+
+        Filters run in SQLite; pages are fetched by id (keyset), so the lock
+        is only held per page and memory stays at one page.
+        """
+        where, params = ["id > ?"], []
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if start:
+            where.append("date >= ?")
+            params.append(start)
+        if end:
+            where.append("date <= ?")
+            params.append(end)
+        if category:
+            where.append("category = ? COLLATE NOCASE")
+            params.append(category)
+        query = (f"SELECT id, {', '.join(COLUMNS)} FROM expenses "
+                 f"WHERE {' AND '.join(where)} ORDER BY id LIMIT ?")
+
+        last_id = 0
+        while True:
+            with self._lock:
+                page = self.conn.execute(query, (last_id, *params, page_size)).fetchall()
+            if not page:
+                return
+            last_id = page[-1][0]
+            yield [row[1:] for row in page]
+
+    @property
+    def version(self) -> tuple:
+        """Changes on every write, by this connection or another process; used to invalidate caches"""
+        with self._lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return data_version, self.conn.total_changes
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -1,17 +1,36 @@
-from telegram import Update
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, 
+    ApplicationHandlerStop,
+    BaseUpdateProcessor,
     CommandHandler, 
+    CallbackQueryHandler,
     MessageHandler, 
+    TypeHandler,
     filters,
     ContextTypes
 )
 from config import Config
-from gemini_parser import ExpenseParser
+from dedup import DuplicateIndex
+from expense import Expense
+from gemini_parser import ExpenseParser, CATEGORIES
+from importer import StatementImporter
+from workers import WorkerPool
+import exporter
 from sheets_manager import SheetsManager
+import metrics
+from metrics import STAGE_SECONDS, UPDATES_IN_FLIGHT, MESSAGES_TOTAL
 import logging
 from aiohttp import web
 import asyncio
+import contextlib
+import hmac
+import secrets
+import os
+import re
+import signal
+import tempfile
+import uuid
 from datetime import datetime
 import pytz
 
@@ -21,8 +40,92 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-parser = ExpenseParser()
-sheets = SheetsManager()
+# Built in the background by warm_up() so the health server and bot start at once
+parser = None
+sheets = None
+backends_ready = asyncio.Event()
+startup_error = None
+# Recently handled updates, messages and expenses (local; ready at once)
+duplicates = DuplicateIndex()
+# Set in the dispatcher process when WORKERS > 0
+workers = None
+# Background sheet -> ledger sync (one process runs it)
+periodic_sync = None
+
+async def warm_up(catch_up: bool = True):
+    """Build the parser and Sheets clients, retrying Sheets with backoff until it connects"""
+    global parser, sheets, startup_error
+    parser = ExpenseParser()
+    
+    delay = 1
+    while sheets is None:
+        try:
+            sheets = await asyncio.to_thread(SheetsManager)
+        except Exception as e:
+            startup_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Sheets init failed, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+    
+    startup_error = None
+    parser.memory.attach(sheets.ledger)
+    sheets.start_sync_worker()
+    backends_ready.set()
+    logger.info("✅ Parser and Sheets ready")
+    
+    # Catch up with rows added to the sheet while we were down (the ledger is
+    # shared in worker mode, so one worker does it)
+    if catch_up:
+        await asyncio.to_thread(sheets.sync_ledger)
+
+async def wait_for_backends(update: Update) -> bool:
+    """Hold updates that arrive during warm-up until the backends are ready"""
+    if backends_ready.is_set():
+        return True
+    try:
+        await asyncio.wait_for(backends_ready.wait(), timeout=Config.WARMUP_TIMEOUT)
+        return True
+    except asyncio.TimeoutError:
+        await update.effective_message.reply_text("❌ Still starting up, please try again in a minute")
+        return False
+
+def register_metrics():
+    """Export parser/cache/sheets counters; read only when /metrics is scraped"""
+    for key, help_text in [
+        ('llm_calls', 'Gemini requests sent'),
+        ('fallbacks', 'Messages parsed by the fallback parser'),
+        ('json_errors', 'Gemini replies that failed to decode as JSON'),
+        ('invalid_items', 'Expense objects from Gemini dropped by validation'),
+        ('memory_hits', 'Messages categorized from the user\'s item memory'),
+        ('deadline_fallbacks', 'Messages answered by the fallback parser after GEMINI_DEADLINE'),
+        ('late_fixups', 'Late Gemini answers used to correct saved expenses'),
+    ]:
+        metrics.Callback(f"expense_bot_parser_{key}_total", help_text, lambda key=key: parser.stats[key])
+    metrics.Callback("expense_bot_parse_cache_hits_total", "Parse cache hits", lambda: parser.cache.hits)
+    metrics.Callback("expense_bot_parse_cache_misses_total", "Parse cache misses", lambda: parser.cache.misses)
+    metrics.Callback("expense_bot_duplicates_total", "Updates, messages and expenses caught as duplicates",
+                     lambda: duplicates.hits)
+    metrics.Callback("expense_bot_gemini_admitted_total", "Messages admitted within the Gemini budget",
+                     lambda: parser.scheduler.stats['admitted'])
+    metrics.Callback("expense_bot_gemini_throttled_total", "Messages sent to the fallback parser for lack of Gemini budget",
+                     lambda: parser.scheduler.stats['throttled'])
+    for key, help_text in [
+        ('calls', 'Gemini calls eligible for hedging'),
+        ('hedged', 'Gemini calls re-sent after passing the latency percentile'),
+        ('hedge_wins', 'Hedged calls answered first by the second copy'),
+    ]:
+        metrics.Callback(f"expense_bot_gemini_hedge_{key}_total", help_text,
+                         lambda key=key: parser.hedger.stats[key])
+    metrics.Callback("expense_bot_gemini_queue_depth", "Messages waiting for Gemini budget",
+                     lambda: len(parser.scheduler), kind="gauge")
+    for key, help_text in [
+        ('rows_written', 'Rows appended to the sheet'),
+        ('write_errors', 'Failed sheet append calls'),
+        ('sync_errors', 'Failed sheet to ledger syncs'),
+    ]:
+        metrics.Callback(f"expense_bot_sheets_{key}_total", help_text, lambda key=key: sheets.stats[key])
+
+register_metrics()
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send welcome message"""
@@ -46,53 +149,363 @@ I'll automatically:
 Commands:
 /start - Show this message
 /today - Today's total expenses
+/week - Last 7 days by day and category
+/month - This month by category, vendor and item
+/category <name> - This month's spend in one category
+/import - Send a CSV statement or text file with /import as the caption
+/export [csv|parquet] [from] [to] [category] - Download your expenses
+/budget - This month's budgets; /budget 20000 or /budget Food 5000 to set
     """
     await update.message.reply_text(welcome_msg)
 
 async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show today's total"""
+    if not await wait_for_backends(update):
+        return
     try:
-        total = sheets.get_today_total()
-        count = sheets.get_today_count()
+        total, count = sheets.get_today_summary(update.effective_user.id)
         await update.message.reply_text(
             f"💰 Today's Summary:\n\nTotal: ₹{total:.2f}\nTransactions: {count}"
         )
     except Exception as e:
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
+def format_breakdown(rows: list) -> str:
+    return "\n".join(f"• {label}: ₹{total:.2f} ({count})" for label, total, count in rows)
+
+async def week_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the last 7 days"""
+    if not await wait_for_backends(update):
+        return
+    try:
+        report = await asyncio.to_thread(sheets.reports.week, update.effective_user.id)
+        days = "\n".join(f"{day.strftime('%a %d %b')}: ₹{total:.2f}" for day, total in report['daily'])
+        await update.message.reply_text(
+            f"📊 Last 7 Days:\n\nTotal: ₹{report['total']:.2f}\nTransactions: {report['count']}\n\n"
+            f"{days}\n\n📁 By category:\n{format_breakdown(report['categories']) or '—'}"
+        )
+    except Exception as e:
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def month_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show this month's breakdown"""
+    if not await wait_for_backends(update):
+        return
+    try:
+        report = await asyncio.to_thread(sheets.reports.month, update.effective_user.id)
+        await update.message.reply_text(
+            f"📅 {report['start'].strftime('%B %Y')}:\n\nTotal: ₹{report['total']:.2f}\n"
+            f"Transactions: {report['count']}\n\n"
+            f"📁 By category:\n{format_breakdown(report['categories']) or '—'}\n\n"
+            f"🏪 Top vendors:\n{format_breakdown(report['vendors']) or '—'}\n\n"
+            f"🏷️ Top items:\n{format_breakdown(report['items']) or '—'}"
+        )
+    except Exception as e:
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def category_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show this month's spend in one category"""
+    if not context.args:
+        await update.message.reply_text("Usage: /category <name>, e.g. /category Food")
+        return
+    if not await wait_for_backends(update):
+        return
+    try:
+        report = await asyncio.to_thread(
+            sheets.reports.category, " ".join(context.args), update.effective_user.id
+        )
+        await update.message.reply_text(
+            f"📁 {report['category']} in {report['start'].strftime('%B %Y')}:\n\n"
+            f"Total: ₹{report['total']:.2f}\nTransactions: {report['count']}\n\n"
+            f"🏷️ Top items:\n{format_breakdown(report['items']) or '—'}\n\n"
+            f"🏪 Top vendors:\n{format_breakdown(report['vendors']) or '—'}"
+        )
+    except Exception as e:
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+def format_import(stats: dict) -> str:
+    return (f"Lines read: {stats['lines']}\nImported: {stats['imported']}\n"
+            f"By rules: {stats['rules']} · By Gemini: {stats['gemini']}\n"
+            f"Skipped: {stats['skipped']} · Failed: {stats['failed']}")
+
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Explain how to import (the file itself arrives as a document)"""
+    await update.message.reply_text(
+        "📥 Send a bank/UPI CSV export or a text file (one expense per line) "
+        "with /import as the caption."
+    )
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Import an uploaded statement captioned /import"""
+    document = update.message.document
+    if document.file_size and document.file_size > Config.IMPORT_MAX_BYTES:
+        await update.message.reply_text(
+            f"❌ File too large (max {Config.IMPORT_MAX_BYTES // (1024 * 1024)} MB)"
+        )
+        return
+    if not await wait_for_backends(update):
+        return
+    
+    status_msg = await update.message.reply_text("⏳ Importing...")
+    
+    async def progress(stats: dict):
+        await status_msg.edit_text("⏳ Importing...\n\n" + format_import(stats))
+    
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(document.file_name or '')[1])
+    os.close(fd)
+    try:
+        telegram_file = await document.get_file()
+        await telegram_file.download_to_drive(path)
+        importer = StatementImporter(
+            parser, sheets,
+            user_id=update.effective_user.id,
+            chat_id=update.effective_chat.id,
+            progress=progress,
+        )
+        stats = await importer.run(path)
+        response = "✅ Import finished!\n\n" + format_import(stats)
+    except Exception as e:
+        logger.error(f"Import failed: {e}")
+        response = f"❌ Import failed: {str(e)}"
+    finally:
+        os.remove(path)
+    
+    await status_msg.edit_text(response)
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send the user's expenses as a CSV or Parquet file, e.g. /export parquet 2026-01-01 2026-03-31 Food"""
+    fmt, dates, category = 'csv', [], None
+    for arg in context.args or []:
+        if arg.lower() in exporter.FORMATS:
+            fmt = arg.lower()
+        elif re.fullmatch(r'\d{4}-\d{2}-\d{2}', arg):
+            dates.append(arg)
+        else:
+            category = arg
+    if not await wait_for_backends(update):
+        return
+    
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        count = await asyncio.to_thread(
+            exporter.export, sheets.ledger, path, fmt,
+            user_id=update.effective_user.id,
+            start=dates[0] if dates else None,
+            end=dates[1] if len(dates) > 1 else None,
+            category=category,
+        )
+        if not count:
+            await update.message.reply_text("📭 No expenses match that export")
+            return
+        with open(path, 'rb') as f:
+            await update.message.reply_document(
+                document=f, filename=f"expenses.{fmt}", caption=f"📤 {count} expense(s)"
+            )
+    except Exception as e:
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+    finally:
+        os.remove(path)
+
+async def budget_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show budgets, or set one: /budget 20000, /budget Food 5000 (0 removes it)"""
+    if not await wait_for_backends(update):
+        return
+    user_id = update.effective_user.id
+    args = context.args or []
+    try:
+        if args:
+            amount = float(args[-1].replace(',', '').lstrip('₹'))
+            category = " ".join(args[:-1])
+            category = next((c for c in CATEGORIES if c.lower() == category.lower()), category.title())
+            await asyncio.to_thread(sheets.budgets.set_budget, user_id, amount, category)
+            name = f"{category} budget" if category else "Monthly budget"
+            await update.message.reply_text(
+                f"✅ {name} set to ₹{amount:.2f}" if amount > 0 else f"🗑️ {name} removed"
+            )
+            return
+        
+        rows = sheets.budgets.status(user_id)
+        if not rows:
+            await update.message.reply_text("No budgets yet. Set one with /budget 20000 or /budget Food 5000")
+            return
+        lines = [
+            f"{'🚨' if spent >= limit else '⚠️' if spent >= 0.8 * limit else '✅'} "
+            f"{category or 'Total'}: ₹{spent:.2f} / ₹{limit:.2f} ({spent / limit:.0%})"
+            for category, spent, limit in rows
+        ]
+        await update.message.reply_text("💼 Budgets this month:\n\n" + "\n".join(lines))
+    except ValueError:
+        await update.message.reply_text("Usage: /budget, /budget 20000 or /budget Food 5000")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def show_progress(message, expenses_list: list):
+    """Edit the "Processing..." reply with expenses parsed so far, throttled"""
+    shown = 0
+    while True:
+        await asyncio.sleep(Config.REPLY_EDIT_INTERVAL)
+        if len(expenses_list) == shown:
+            continue
+        shown = len(expenses_list)
+        lines = [f"{i}. ₹{exp.amount} - {exp.item}" for i, exp in enumerate(expenses_list, 1)]
+        try:
+            await message.edit_text("⏳ Saving...\n\n" + "\n".join(lines))
+        except Exception as e:
+            logger.warning(f"Progress edit failed: {e}")
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Process expense messages"""
-    user_message = update.message.text
-    processing_msg = await update.message.reply_text("⏳ Processing...")
+    UPDATES_IN_FLIGHT.inc()
+    MESSAGES_TOTAL.inc()
+    try:
+        if duplicates.seen_update(update.update_id):
+            logger.info(f"Ignoring redelivered update {update.update_id}")
+            return
+        if await wait_for_backends(update):
+            await _handle_message(
+                update.message, update.message.text, update.effective_user.id, update.effective_chat.id
+            )
+    finally:
+        UPDATES_IN_FLIGHT.dec()
+
+async def confirm_duplicate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """"Save anyway" button under a duplicate notice"""
+    query = update.callback_query
+    pending = duplicates.pop_confirmation(query.data.split(':', 1)[1])
+    if pending is None:
+        await query.answer("This confirmation has expired", show_alert=True)
+        return
+    await query.answer()
+    await query.edit_message_reply_markup(reply_markup=None)
+    if await wait_for_backends(update):
+        user_id, chat_id, text, expenses = pending
+        await _handle_message(query.message, text, user_id, chat_id, force=True, expenses=expenses)
+
+def save_anyway_markup(user_id: int, chat_id: int, text: str, expenses: list = None):
+    token = duplicates.confirmation_token(user_id, chat_id, text, expenses)
+    return InlineKeyboardMarkup([[InlineKeyboardButton("✅ Save anyway", callback_data=f"dup:{token}")]])
+
+async def timed_save(expense: Expense, user_id: int, chat_id: int, alerts: list,
+                     row_id: str = None) -> bool:
+    with STAGE_SECONDS.labels(stage='sheet_save').time():
+        return await sheets.add_expense(expense, user_id=user_id, chat_id=chat_id, alerts=alerts,
+                                        row_id=row_id)
+
+async def _iterate(expenses: list):
+    for expense in expenses:
+        yield expense
+
+async def _handle_message(message, user_message: str, user_id: int, chat_id: int,
+                          force: bool = False, expenses: list = None):
+    """Parse and save one message; force skips duplicate checks ("Save anyway"),
+    and expenses, when given, are saved as they are instead of parsing the text"""
+    if not force:
+        previous = duplicates.find_message(user_id, chat_id, user_message)
+        if previous is not None:
+            await message.reply_text(
+                f"🔁 You sent this a moment ago:\n\n{previous}",
+                reply_markup=save_anyway_markup(user_id, chat_id, user_message),
+            )
+            return
+    
+    processing_msg = await message.reply_text("⏳ Processing...")
     
     # Get date when user sent the message
     ist = pytz.timezone('Asia/Kolkata')
-    timestamp = update.message.date.astimezone(ist)
+    timestamp = message.date.astimezone(ist)
     date_str = timestamp.strftime("%d %b %Y")
+    markup = None
     
     try:
-        expenses_list = await parser.parse_expense(user_message)
+        expenses_list = []
+        row_ids = []
+        # Tags this message's duplicate claims; only earlier messages count as duplicates
+        claim = uuid.uuid4().hex
+        skipped = []
+        saves = []
+        alerts = []
+        
+        async def fix_up(corrected: list):
+            """Gemini answered after the fallback parse was saved: correct the rows"""
+            try:
+                results = await asyncio.gather(*saves)
+                saved = [(row_id, exp) for row_id, exp, ok in zip(row_ids, expenses_list, results) if ok]
+                if not saved and skipped:
+                    # Everything was a duplicate; don't bring it back
+                    return
+                changed = await sheets.correct_expenses(
+                    [row_id for row_id, _ in saved], [exp for _, exp in saved], corrected,
+                    user_id=user_id, chat_id=chat_id,
+                )
+                if changed:
+                    lines = "\n".join(
+                        f"• ₹{new.amount} - {new.item} 📁 {new.category}" + (" (added)" if old is None else "")
+                        if new is not None else f"• ₹{old.amount} - {old.item} (removed)"
+                        for old, new in changed
+                    )
+                    await message.reply_text(f"✏️ Updated:\n\n{lines}")
+            except Exception as e:
+                logger.error(f"Error correcting saved expenses: {e}")
+        
+        progress = asyncio.create_task(show_progress(processing_msg, expenses_list))
+        try:
+            # Each expense is queued for the sheet as soon as the parser emits it;
+            # expenses emitted together still share one batched write
+            if expenses is not None:
+                source = _iterate(expenses)
+            else:
+                source = parser.parse_expense_stream(user_message, user_id, on_late=fix_up)
+            with STAGE_SECONDS.labels(stage='parse').time():
+                async for expense in source:
+                    if not duplicates.claim_expense(user_id, chat_id, expense, claim) and not force:
+                        skipped.append(expense)
+                        continue
+                    expenses_list.append(expense)
+                    row_ids.append(uuid.uuid4().hex)
+                    saves.append(asyncio.ensure_future(
+                        timed_save(expense, user_id, chat_id, alerts, row_ids[-1])
+                    ))
+        finally:
+            progress.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await progress
+        
+        if skipped:
+            markup = save_anyway_markup(user_id, chat_id, user_message, skipped)
+            duplicate_lines = "\n".join(f"• ₹{exp.amount} - {exp.item}" for exp in skipped)
         
         if not expenses_list:
-            await processing_msg.edit_text("❌ No expenses found")
+            if skipped:
+                await processing_msg.edit_text(
+                    f"🔁 Already saved recently:\n\n{duplicate_lines}", reply_markup=markup
+                )
+            else:
+                await processing_msg.edit_text("❌ No expenses found")
             return
         
-        success_count = 0
-        for expense_data in expenses_list:
-            success = await sheets.add_expense(expense_data)
-            if success:
-                success_count += 1
+        results = await asyncio.gather(*saves)
+        success_count = sum(results)
+        for expense, saved in zip(expenses_list, results):
+            if not saved:
+                duplicates.release_expense(user_id, chat_id, expense)
         
         if success_count == len(expenses_list):
             if len(expenses_list) == 1:
                 exp = expenses_list[0]
-                response = f"✅ Saved!\n\n💵 ₹{exp['amount']}\n📁 {exp['category']}\n🏷️ {exp['item']}\n🏪 {exp['vendor']}\n\n📅 {date_str}"
+                response = f"✅ Saved!\n\n💵 ₹{exp.amount}\n📁 {exp.category}\n🏷️ {exp.item}\n🏪 {exp.vendor}\n\n📅 {date_str}"
             else:
                 response = f"✅ Saved {success_count} expenses!\n\n"
-                total = sum(exp['amount'] for exp in expenses_list)
+                total = sum(exp.amount for exp in expenses_list)
                 for i, exp in enumerate(expenses_list, 1):
-                    response += f"{i}. ₹{exp['amount']} - {exp['item']}\n"
+                    response += f"{i}. ₹{exp.amount} - {exp.item}\n"
                 response += f"\n💰 Total: ₹{total:.2f}\n📅 {date_str}"
+            if alerts:
+                response += "\n\n" + "\n".join(alerts)
+            if not skipped:
+                duplicates.remember_message(user_id, chat_id, user_message, response)
+            else:
+                response += f"\n\n🔁 Skipped (saved recently):\n{duplicate_lines}"
         else:
             response = f"⚠️ Saved {success_count}/{len(expenses_list)} expenses"
             
@@ -100,40 +513,282 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error: {e}")
         response = f"❌ Error: {str(e)}"
     
-    await processing_msg.edit_text(response)
+    with STAGE_SECONDS.labels(stage='reply_edit').time():
+        await processing_msg.edit_text(response, reply_markup=markup)
 
 async def health_check(request):
     return web.Response(text="OK")
 
-async def start_http_server():
-    """Start HTTP server for Render health checks"""
+async def readiness_check(request):
+    """200 once the parser and Sheets clients are warm, 503 before that"""
+    if workers is not None:
+        alive = workers.alive()
+        status = {'ready': alive == len(workers.processes), 'workers': alive}
+        return web.json_response(status, status=200 if status['ready'] else 503)
+    status = {
+        'ready': backends_ready.is_set(),
+        'parser': parser is not None,
+        'sheets': sheets is not None,
+        'error': startup_error,
+    }
+    return web.json_response(status, status=200 if status['ready'] else 503)
+
+async def metrics_endpoint(request):
+    """This process' metrics, or in worker mode every worker's (labelled by worker)"""
+    if workers is not None:
+        text = metrics.render(await asyncio.to_thread(workers.collect_metrics))
+    else:
+        text = metrics.render()
+    return web.Response(text=text, content_type='text/plain', charset='utf-8',
+                        headers={'X-Prometheus-Format': '0.0.4'})
+
+async def telegram_webhook(request):
+    """Receive an update pushed by Telegram and hand it to the bot"""
+    token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(token, request.app['webhook_secret']):
+        return web.Response(status=403)
+    
+    application = request.app['application']
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+    
+    await application.update_queue.put(Update.de_json(data, application.bot))
+    return web.Response(text="OK")
+
+async def start_http_server(application: Application, webhook_secret: str = None) -> web.AppRunner:
+    """Start HTTP server for Render health checks (and the webhook endpoint)"""
     app = web.Application()
     app.router.add_get('/', health_check)
     app.router.add_get('/health', health_check)
+    app.router.add_get('/ready', readiness_check)
+    app.router.add_get('/metrics', metrics_endpoint)
+    
+    if webhook_secret:
+        app['application'] = application
+        app['webhook_secret'] = webhook_secret
+        app.router.add_post(Config.WEBHOOK_PATH, telegram_webhook)
     
     runner = web.AppRunner(app)
     await runner.setup()
     
-    import os
-    port = int(os.getenv('PORT', 10000))
-    
-    site = web.TCPSite(runner, '0.0.0.0', port)
+    site = web.TCPSite(runner, '0.0.0.0', Config.PORT)
     await site.start()
-    logger.info(f"🌐 HTTP server started on port {port}")
+    logger.info(f"🌐 HTTP server started on port {Config.PORT}")
+    return runner
 
-def main():
-    """Start the bot"""
-    application = Application.builder().token(Config.TELEGRAM_TOKEN).build()
+async def sync_sheet_periodically():
+    """Pick up rows added or edited directly in the sheet"""
+    while True:
+        await asyncio.sleep(Config.SHEETS_SYNC_INTERVAL)
+        if not backends_ready.is_set():
+            continue
+        await asyncio.to_thread(sheets.sync_ledger)
+        parser.cache.save()
+        duplicates.save()
+
+async def on_startup(application: Application):
+    global periodic_sync
+    # Not application.create_task: Application.stop() would wait for it forever
+    periodic_sync = asyncio.create_task(sync_sheet_periodically())
+
+async def on_shutdown(application: Application):
+    """Write out queued sheet rows and the parse cache before exiting"""
+    if periodic_sync is not None:
+        periodic_sync.cancel()
+    if sheets is not None:
+        await sheets.flush()
+    if parser is not None:
+        parser.cache.save()
+    duplicates.save()
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Runs updates concurrently, except that one chat's updates run one at a time, in order.
+    
+    An update still running after UPDATE_TIMEOUT, or when the bot stops, is
+    abandoned: its task is cancelled, which also cancels its Gemini call.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chats = {}   # chat_id -> [lock, updates holding or waiting for it]
+        self._tasks = set()
+        self._abandoned = False
+
+    async def _run(self, coroutine):
+        if self._abandoned:
+            # Queued behind its chat when the bot began stopping
+            coroutine.close()
+            return
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        try:
+            await asyncio.wait_for(task, timeout=Config.UPDATE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Update abandoned after {Config.UPDATE_TIMEOUT:g}s")
+        except asyncio.CancelledError:
+            if not self._abandoned:
+                raise
+        finally:
+            self._tasks.discard(task)
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            await self._run(coroutine)
+            return
+        
+        entry = self._chats.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat.id]
+
+    def abandon(self):
+        """Cancel the updates still running (call before Application.stop)"""
+        self._abandoned = True
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self.abandon()
+
+async def forward_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Dispatcher: hand the update to the worker that owns its chat"""
+    chat = update.effective_chat
+    workers.dispatch(chat.id if chat else update.update_id, update.to_dict())
+    raise ApplicationHandlerStop
+
+async def run(application: Application):
+    """Run the bot and the HTTP server on one event loop until SIGINT/SIGTERM.
+    
+    With WEBHOOK_URL set, Telegram pushes updates to the aiohttp server;
+    otherwise the bot long-polls getUpdates. With WORKERS set, this process
+    only receives updates and the worker processes handle them.
+    """
+    global workers
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+    
+    use_webhook = bool(Config.WEBHOOK_URL)
+    webhook_secret = (Config.WEBHOOK_SECRET or secrets.token_urlsafe(32)) if use_webhook else None
+    
+    if Config.WORKERS > 0:
+        workers = WorkerPool(Config.WORKERS)
+        workers.start()
+        application.add_handler(TypeHandler(Update, forward_update), group=-1)
+    
+    # Health checks answer before anything slow (Telegram getMe, Google auth) runs
+    runner = await start_http_server(application, webhook_secret)
+    warm_up_task = asyncio.create_task(warm_up()) if workers is None else None
+    
+    async with application:
+        if workers is None:
+            await on_startup(application)
+        await application.start()
+        
+        if use_webhook:
+            await application.bot.set_webhook(
+                url=Config.WEBHOOK_URL.rstrip('/') + Config.WEBHOOK_PATH,
+                secret_token=webhook_secret,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+            )
+            logger.info("🚀 Bot started (webhook)!")
+        else:
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            logger.info("🚀 Bot started (polling)!")
+        
+        try:
+            await stop.wait()
+        finally:
+            if not use_webhook:
+                await application.updater.stop()
+            await runner.cleanup()
+            application.update_processor.abandon()
+            await application.stop()
+            if workers is not None:
+                await asyncio.to_thread(workers.stop)
+            else:
+                warm_up_task.cancel()
+                await on_shutdown(application)
+
+async def serve_metrics(conn, index: int):
+    """Worker process: answer the dispatcher's /metrics requests"""
+    labels = (('worker', str(index)),)
+    while True:
+        # Short polls so the thread is free again soon after the worker stops
+        if await asyncio.to_thread(conn.poll, 1.0):
+            conn.recv()
+            conn.send(metrics.collect(labels))
+
+async def run_worker(index: int, queue, metrics_conn):
+    """Worker process: handle the updates the dispatcher routes here until it sends None"""
+    application = build_application(updater=False)
+    warm_up_task = asyncio.create_task(warm_up(catch_up=index == 0))
+    metrics_task = asyncio.create_task(serve_metrics(metrics_conn, index))
+    
+    async with application:
+        await application.start()
+        # One worker is enough to pull hand-made sheet edits into the shared ledger
+        if index == 0:
+            await on_startup(application)
+        logger.info(f"👷 Worker {index} started")
+        try:
+            while True:
+                data = await asyncio.to_thread(queue.get)
+                if data is None:
+                    break
+                await application.update_queue.put(Update.de_json(data, application.bot))
+        finally:
+            application.update_processor.abandon()
+            await application.stop()
+            warm_up_task.cancel()
+            metrics_task.cancel()
+            await on_shutdown(application)
+
+def build_application(updater: bool = True) -> Application:
+    """Application with all command and message handlers registered"""
+    builder = (
+        Application.builder()
+        .token(Config.TELEGRAM_TOKEN)
+        .concurrent_updates(ChatOrderedUpdateProcessor(Config.MAX_CONCURRENT_UPDATES))
+    )
+    if not updater:
+        builder = builder.updater(None)
+    application = builder.build()
     
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("today", today_command))
+    application.add_handler(CommandHandler("week", week_command))
+    application.add_handler(CommandHandler("month", month_command))
+    application.add_handler(CommandHandler("category", category_command))
+    application.add_handler(CommandHandler("import", import_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("budget", budget_command))
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(r'^/import\b'), import_document
+    ))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    
-    loop = asyncio.get_event_loop()
-    loop.create_task(start_http_server())
-    
-    logger.info("🚀 Bot started!")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.add_handler(CallbackQueryHandler(confirm_duplicate, pattern=r'^dup:'))
+    return application
+
+def main():
+    """Start the bot"""
+    # Updates arrive through our aiohttp server in webhook mode; no getUpdates poller needed
+    application = build_application(updater=not Config.WEBHOOK_URL)
+    asyncio.run(run(application))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+"""Minimal Prometheus text-format metrics.
+
+Metrics are updated from the event loop thread with plain attribute
+writes (no locks on the hot path); rendering walks the registry on
+each /metrics scrape. Values that already live elsewhere (parser stats,
+cache counters) are exported through callbacks instead of being
+counted twice.
+
+In worker mode each worker process keeps its own registry; the
+dispatcher merges the workers' collect() output into one scrape, with a
+worker label on every series.
+"""
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _registry.append(self)
+
+    def labels(self, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _series(self):
+        if not self.labelnames:
+            return [((), self._default())]
+        return list(self._children.items())
+
+    def samples(self, extra: tuple = ()) -> list:
+        """Sample lines of every series, with the `extra` labels prepended"""
+        lines = []
+        for labels, child in self._series():
+            lines.extend(child.render(self.name, extra + labels))
+        return lines
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, name: str, labels: tuple) -> list:
+        return [f"{name}{_format_labels(labels)} {self.value:g}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._value = _Value()
+
+    def _new_child(self):
+        return _Value()
+
+    def _default(self):
+        return self._value
+
+    def inc(self, amount: float = 1):
+        self._value.value += amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1):
+        self._value.value -= amount
+
+    def set(self, value: float):
+        self._value.value = value
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        """Context manager observing the elapsed wall time of its block"""
+        return _Timer(self)
+
+    def render(self, name: str, labels: tuple) -> list:
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            le = 'le="%g"' % bound
+            lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_format_labels(labels, le)} {self.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {self.sum:g}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+        self._value = _HistogramValue(self.buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _default(self):
+        return self._value
+
+    def observe(self, value: float):
+        self._value.observe(value)
+
+    def time(self) -> _Timer:
+        return _Timer(self._value)
+
+
+class Callback(_Metric):
+    """Value read from fn() at scrape time"""
+
+    def __init__(self, name, help_text, fn, kind: str = "counter"):
+        super().__init__(name, help_text)
+        self.kind = kind
+        self.fn = fn
+
+    def _series(self):
+        value = _Value()
+        try:
+            value.value = float(self.fn())
+        except Exception:
+            value.value = float('nan')
+        return [((), value)]
+
+
+def collect(labels: tuple = ()) -> list:
+    """[(name, help, kind, sample lines)] of every registered metric; picklable,
+    so a worker process can send it to the dispatcher"""
+    return [(metric.name, metric.help, metric.kind, metric.samples(labels)) for metric in _registry]
+
+
+def render(collections: list = None) -> str:
+    """Prometheus text exposition format of this process' metrics, or of the
+    merged collect() output of other processes"""
+    merged = {}
+    for collection in [collect()] if collections is None else collections:
+        for name, help_text, kind, samples in collection:
+            merged.setdefault(name, (help_text, kind, []))[2].extend(samples)
+    lines = []
+    for name, (help_text, kind, samples) in merged.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *samples]
+    return "\n".join(lines) + "\n"
+
+
+# Shared bot metrics
+STAGE_SECONDS = Histogram(
+    "expense_bot_stage_seconds",
+    "Time spent in each stage of handling a message",
+    labelnames=("stage",),
+)
+UPDATES_IN_FLIGHT = Gauge(
+    "expense_bot_updates_in_flight",
+    "Telegram updates currently being handled",
+)
+MESSAGES_TOTAL = Counter(
+    "expense_bot_messages_total",
+    "Expense messages handled",
+)
@@ -0,0 +1,97 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from config import Config
+from expense import Expense
+
+# Per-message fields; stripped from cached templates and re-stamped on a hit
+STAMP_FIELDS = ('date', 'timestamp', 'raw_message')
+
+
+class ParseCache:
+    """Bounded LRU + TTL cache of parsed expenses keyed by normalized message text"""
+
+    def __init__(self, max_size: int = None, ttl: float = None, path: str = None):
+        self.max_size = max_size or Config.PARSE_CACHE_SIZE
+        self.ttl = ttl or Config.PARSE_CACHE_TTL
+        self.path = path if path is not None else Config.PARSE_CACHE_PATH
+        self._entries = OrderedDict()   # key -> (stored_at, [Expense templates])
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self.load()
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        return " ".join(message.lower().split())
+
+    def get(self, message: str):
+        """Return freshly stamped expenses for a cached message, or None"""
+        key = self.normalize(message)
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        now = datetime.now()
+        return [template.stamped(message, now) for template in entry[1]]
+
+    def put(self, message: str, expenses: list):
+        """Cache parsed expenses as templates (re-stamped on every hit)"""
+        templates = [expense.stamped('') for expense in expenses]
+        key = self.normalize(message)
+        self._entries[key] = (time.time(), templates)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    @staticmethod
+    def _template_dict(template: Expense) -> dict:
+        return {k: v for k, v in template.to_dict().items() if k not in STAMP_FIELDS}
+
+    @property
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def load(self):
+        """Load persisted entries, skipping any that have expired"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error loading parse cache: {e}")
+            return
+
+        now = time.time()
+        for key, (stored_at, templates) in data.items():
+            if now - stored_at <= self.ttl:
+                self._entries[key] = (stored_at, [Expense.from_dict(t) for t in templates])
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        """Persist entries to disk (atomic replace); no-op when unchanged"""
+        if not self.path or not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            data = {
+                key: (stored_at, [self._template_dict(t) for t in templates])
+                for key, (stored_at, templates) in self._entries.items()
+            }
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Error saving parse cache: {e}")
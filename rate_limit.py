@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens/second, holding at most `capacity`.
+
+    Each bucket is used from one thread only (the event loop, or the ledger
+    sync thread for wait()), so no locking.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n: float = 1) -> bool:
+        """Take n tokens if available right now"""
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def wait_time(self, n: float = 1) -> float:
+        """Seconds until n tokens will be available"""
+        self._refill()
+        return max(0.0, (n - self.tokens) / self.rate)
+
+    async def acquire(self, n: float = 1):
+        """Wait until n tokens are available, then take them (at most a full bucket,
+        or a request bigger than the bucket would wait forever)"""
+        n = min(n, self.capacity)
+        while not self.try_acquire(n):
+            await asyncio.sleep(self.wait_time(n))
+
+    def wait(self, n: float = 1):
+        """Blocking acquire, for callers on a worker thread"""
+        n = min(n, self.capacity)
+        while not self.try_acquire(n):
+            time.sleep(self.wait_time(n))
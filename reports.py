@@ -0,0 +1,157 @@
+import numpy as np
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from config import Config
+
+EPOCH = date(1970, 1, 1)
+
+
+def day_number(day: date) -> int:
+    """Days since 1970-01-01, the integer date encoding used by ExpenseFrame"""
+    return (day - EPOCH).days
+
+
+def _is_date(text: str) -> bool:
+    """Hand-edited cells can be ISO-shaped but impossible ("2026-02-30")"""
+    try:
+        date.fromisoformat(text)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+class ExpenseFrame:
+    """Column arrays for one user's expenses.
+
+    Dates are int32 day numbers, amounts float64, and text columns are
+    dictionary-encoded (codes index into the sorted label array), so every
+    report is a mask plus a bincount instead of a loop over rows.
+    """
+
+    def __init__(self, rows: list):
+        # Rows with impossible dates are left out rather than failing every report
+        rows = [row for row in rows if _is_date(row[0])]
+        if rows:
+            dates, amounts, categories, vendors, items = zip(*rows)
+        else:
+            dates = amounts = categories = vendors = items = ()
+        self.days = np.array(dates, dtype='datetime64[D]').astype(np.int32)
+        self.amounts = np.array(amounts, dtype=np.float64)
+        # field -> (labels, codes)
+        self.columns = {
+            'category': self._encode(categories),
+            'vendor': self._encode(vendors),
+            'item': self._encode(items),
+        }
+
+    @staticmethod
+    def _encode(values):
+        labels, codes = np.unique(
+            np.array([v or "Unknown" for v in values], dtype=object).astype(str),
+            return_inverse=True,
+        )
+        return labels, codes.astype(np.int32)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def between(self, start: date, end: date) -> np.ndarray:
+        """Boolean mask of expenses dated start..end inclusive"""
+        return (self.days >= day_number(start)) & (self.days <= day_number(end))
+
+    def total(self, mask: np.ndarray) -> tuple:
+        """(total, count) of the masked expenses"""
+        return float(self.amounts[mask].sum()), int(mask.sum())
+
+    def daily_totals(self, start: date, end: date) -> np.ndarray:
+        """Total per day, start..end inclusive (zeros for days with no spend)"""
+        mask = self.between(start, end)
+        return np.bincount(
+            self.days[mask] - day_number(start),
+            weights=self.amounts[mask],
+            minlength=(end - start).days + 1,
+        )
+
+    def breakdown(self, field: str, mask: np.ndarray, limit: int = None) -> list:
+        """[(label, total, count)] grouped by category/vendor/item, largest first"""
+        labels, codes = self.columns[field]
+        codes = codes[mask]
+        totals = np.bincount(codes, weights=self.amounts[mask], minlength=len(labels))
+        counts = np.bincount(codes, minlength=len(labels))
+        order = np.argsort(-totals, kind='stable')
+        order = order[counts[order] > 0][:limit]
+        return [(str(labels[i]), float(totals[i]), int(counts[i])) for i in order]
+
+
+class ReportStore:
+    """Per-user ExpenseFrames loaded from the ledger, rebuilt when the ledger changes"""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()   # user_id -> (ledger version, ExpenseFrame)
+
+    def frame(self, user_id: int = None) -> ExpenseFrame:
+        version = self.ledger.version
+        with self._lock:
+            cached = self._frames.get(user_id)
+            if cached is not None and cached[0] == version:
+                self._frames.move_to_end(user_id)
+                return cached[1]
+        
+        frame = ExpenseFrame(self.ledger.fetch_columns(user_id))
+        with self._lock:
+            self._frames[user_id] = (version, frame)
+            while len(self._frames) > Config.REPORT_CACHE_SIZE:
+                self._frames.popitem(last=False)
+        return frame
+
+    def week(self, user_id: int = None, today: date = None) -> dict:
+        """Last 7 days: total, per-day totals and top categories"""
+        today = today or date.today()
+        start = today - timedelta(days=6)
+        frame = self.frame(user_id)
+        mask = frame.between(start, today)
+        total, count = frame.total(mask)
+        daily = frame.daily_totals(start, today)
+        return {
+            'start': start, 'end': today, 'total': total, 'count': count,
+            'daily': [(start + timedelta(days=i), float(v)) for i, v in enumerate(daily)],
+            'categories': frame.breakdown('category', mask),
+        }
+
+    def month(self, user_id: int = None, today: date = None) -> dict:
+        """Current calendar month: total, categories, top vendors and items"""
+        today = today or date.today()
+        start = today.replace(day=1)
+        frame = self.frame(user_id)
+        mask = frame.between(start, today)
+        total, count = frame.total(mask)
+        return {
+            'start': start, 'end': today, 'total': total, 'count': count,
+            'categories': frame.breakdown('category', mask),
+            'vendors': frame.breakdown('vendor', mask, limit=Config.REPORT_TOP_N),
+            'items': frame.breakdown('item', mask, limit=Config.REPORT_TOP_N),
+        }
+
+    def category(self, category: str, user_id: int = None, today: date = None) -> dict:
+        """One category this month: total and its top items and vendors"""
+        today = today or date.today()
+        start = today.replace(day=1)
+        frame = self.frame(user_id)
+        labels, codes = frame.columns['category']
+        matches = np.flatnonzero(np.char.lower(labels) == category.lower())
+        mask = frame.between(start, today)
+        if len(matches):
+            mask &= codes == matches[0]
+            name = str(labels[matches[0]])
+        else:
+            mask &= False
+            name = category
+        total, count = frame.total(mask)
+        return {
+            'category': name, 'start': start, 'end': today, 'total': total, 'count': count,
+            'items': frame.breakdown('item', mask, limit=Config.REPORT_TOP_N),
+            'vendors': frame.breakdown('vendor', mask, limit=Config.REPORT_TOP_N),
+        }
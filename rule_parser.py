@@ -0,0 +1,168 @@
+import re
+from config import Config
+from expense import Expense
+
+# Category tables in priority order: the first table with a hit wins.
+# sub_category None means "use the matched keyword" (e.g. Travel -> "Metro").
+# fixed_item None means "use the matched keyword as the item".
+CATEGORY_TABLES = [
+    ("Groceries", "Home groceries", "groceries",
+     ['grocery', 'groceries', 'vegetables', 'fruits', 'ration', 'provisions']),
+    ("Travel", None, None,
+     ['petrol', 'diesel', 'fuel', 'gas', 'uber', 'ola', 'taxi', 'auto', 'metro', 'bus']),
+    ("Shopping", "Electronics", None,
+     ['phone', 'mobile', 'laptop', 'charger', 'headphone', 'earphone', 'cable', 'accessory', 'accessories']),
+    ("Shopping", "Clothing", None,
+     ['jeans', 'shirt', 'tshirt', 't-shirt', 'shoes', 'pants', 'dress', 'clothes']),
+    ("Food", "Restaurant/Delivery", None,
+     ['pizza', 'burger', 'biryani', 'food', 'lunch', 'dinner', 'breakfast', 'snacks', 'coffee', 'tea', 'chai']),
+    ("Healthcare", "Medical", None,
+     ['medicine', 'doctor', 'hospital', 'pharmacy', 'medical', 'clinic']),
+    ("Bills", "Utility", None,
+     ['electricity', 'water', 'internet', 'mobile bill', 'recharge', 'broadband']),
+]
+
+VENDORS = {
+    'swiggy': 'Swiggy', 'zomato': 'Zomato',
+    'uber': 'Uber', 'ola': 'Ola',
+    'amazon': 'Amazon', 'flipkart': 'Flipkart',
+    'myntra': 'Myntra', 'ajio': 'Ajio',
+    'bigbasket': 'BigBasket', 'blinkit': 'Blinkit',
+    'zepto': 'Zepto', 'dunzo': 'Dunzo',
+}
+
+# Category implied by the vendor when no item keyword matched ("uber 180")
+VENDOR_CATEGORIES = {
+    'Swiggy': ("Food", "Restaurant/Delivery"), 'Zomato': ("Food", "Restaurant/Delivery"),
+    'Uber': ("Travel", "Cab"), 'Ola': ("Travel", "Cab"),
+    'Amazon': ("Shopping", "Online"), 'Flipkart': ("Shopping", "Online"),
+    'Myntra': ("Shopping", "Clothing"), 'Ajio': ("Shopping", "Clothing"),
+    'BigBasket': ("Groceries", "Home groceries"), 'Blinkit': ("Groceries", "Home groceries"),
+    'Zepto': ("Groceries", "Home groceries"), 'Dunzo': ("Groceries", "Home groceries"),
+}
+
+PAYMENT_MODES = {
+    'upi': 'UPI', 'gpay': 'UPI', 'phonepe': 'UPI', 'paytm': 'UPI',
+    'cash': 'Cash',
+    'card': 'Card', 'credit card': 'Card', 'debit card': 'Card',
+}
+
+AMOUNT_RE = re.compile(r'(?<![\w.])(?:₹|rs\.?|inr)?\s*(\d+(?:\.\d+)?)(?![\w.])', re.IGNORECASE)
+
+# Anything hinting at dates, several items or non-spend money movement goes to Gemini
+AMBIGUOUS_RE = re.compile(
+    r'\b(?:and|yesterday|ago|last|tomorrow|split|each|per|refund|received|got|owe|lent|borrowed|emi|salary)\b'
+    r'|[,;+&\n]',
+    re.IGNORECASE,
+)
+
+
+class KeywordMatcher:
+    """Single-pass matcher over all keyword tables.
+
+    Every keyword is compiled into one alternation (longest first), so a
+    message is scanned once by the regex engine instead of once per table
+    and keyword. Keywords match on word boundaries and tolerate a plural
+    "s"/"es" suffix.
+    """
+
+    def __init__(self):
+        # keyword -> list of (kind, rank, payload)
+        self._entries = {}
+        for rank, (category, sub_category, fixed_item, keywords) in enumerate(CATEGORY_TABLES):
+            for position, kw in enumerate(keywords):
+                payload = (category, sub_category, fixed_item, position)
+                self._entries.setdefault(kw, []).append(('category', rank, payload))
+        for rank, (kw, name) in enumerate(VENDORS.items()):
+            self._entries.setdefault(kw, []).append(('vendor', rank, name))
+        for rank, (kw, mode) in enumerate(PAYMENT_MODES.items()):
+            self._entries.setdefault(kw, []).append(('payment', rank, mode))
+
+        alternation = '|'.join(
+            re.escape(kw) for kw in sorted(self._entries, key=len, reverse=True)
+        )
+        self._pattern = re.compile(rf'(?<![a-z])({alternation})(?:e?s)?(?![a-z])')
+
+    def scan(self, text: str) -> dict:
+        """Returns the best hit per kind: {'category': (kw, payload), 'vendor': ..., 'payment': ...}"""
+        best = {}
+        for match in self._pattern.finditer(text.lower()):
+            kw = match.group(1)
+            for kind, rank, payload in self._entries[kw]:
+                # Lower rank wins; for categories, earlier keyword within the table breaks ties
+                key = (rank, payload[3]) if kind == 'category' else (rank,)
+                if kind not in best or key < best[kind][0]:
+                    best[kind] = (key, kw, payload)
+        return {kind: (kw, payload) for kind, (_, kw, payload) in best.items()}
+
+
+class RuleParser:
+    """Deterministic parser for simple "amount + item" messages, with a confidence score"""
+
+    def __init__(self):
+        self.matcher = KeywordMatcher()
+
+    def categorize(self, context: str) -> tuple:
+        """Returns (category, sub_category, item)"""
+        return self._categorize(context, self.matcher.scan(context))
+
+    def _categorize(self, context: str, hits: dict) -> tuple:
+        if 'category' not in hits:
+            return ("Other", "Miscellaneous", context.lower()[:30])
+        kw, (category, sub_category, fixed_item, _) = hits['category']
+        return (category, sub_category or kw.title(), fixed_item or kw)
+
+    def extract_vendor(self, context: str) -> str:
+        """Extract vendor/platform name"""
+        hit = self.matcher.scan(context).get('vendor')
+        return hit[1] if hit else "Unknown"
+
+    def parse(self, message: str) -> tuple:
+        """Returns (expenses, confidence); confidence 0 means "ask Gemini".
+
+        Only single-amount messages without date words or multiple items
+        are handled here. The score rewards a known item keyword, a known
+        vendor and a short message.
+        """
+        amounts = AMOUNT_RE.findall(message)
+        if len(amounts) != 1 or AMBIGUOUS_RE.search(message):
+            return [], 0.0
+
+        short = len(message.split()) <= Config.RULE_MAX_WORDS
+        return self._score(message, float(amounts[0]), self.matcher.scan(message), short)
+
+    def parse_statement_row(self, description: str, amount: float) -> tuple:
+        """(expenses, confidence) for a bank/UPI statement line whose amount is known.
+
+        Descriptions are long and full of reference numbers, so only the
+        keyword and vendor hits count towards the score.
+        """
+        return self._score(description, float(amount), self.matcher.scan(description), True)
+
+    def _score(self, message: str, amount: float, hits: dict, short: bool) -> tuple:
+        category, sub_category, item = self._categorize(message, hits)
+        vendor = hits['vendor'][1] if 'vendor' in hits else "Unknown"
+
+        confidence = 0.3
+        if 'category' in hits:
+            confidence += 0.5
+        elif vendor in VENDOR_CATEGORIES:
+            category, sub_category = VENDOR_CATEGORIES[vendor]
+            item = sub_category.lower()
+            confidence += 0.4
+        if vendor != "Unknown":
+            confidence += 0.1
+        if short:
+            confidence += 0.2
+
+        expense = Expense(
+            amount=amount,
+            category=category,
+            sub_category=sub_category,
+            item=item,
+            vendor=vendor,
+            payment_mode=hits['payment'][1] if 'payment' in hits else "Unknown",
+            notes=message[:100],
+            raw_message=message,
+        )
+        return [expense], min(confidence, 1.0)
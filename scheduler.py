@@ -0,0 +1,129 @@
+import asyncio
+from collections import OrderedDict, deque
+from config import Config
+from rate_limit import TokenBucket
+
+INTERACTIVE, BULK = 0, 1
+
+
+PROMPT_OVERHEAD = 150
+
+
+def estimate_tokens(message: str, amounts: int = 1, prompt_overhead: int = PROMPT_OVERHEAD) -> int:
+    """Rough Gemini token cost of parsing a message: prompt text plus reply"""
+    reply_per_expense = 60
+    return prompt_overhead + len(message) // 4 + reply_per_expense * max(1, amounts)
+
+
+class GeminiScheduler:
+    """Admits messages to Gemini within a global request and token budget.
+
+    Waiting messages are queued per user and served round-robin, so one
+    user's bulk paste can't starve everyone else; interactive (short)
+    messages are always served before bulk ones. A message that can't get
+    budget before its deadline is refused and the caller degrades to the
+    local parser.
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket(
+            rate=Config.GEMINI_REQUESTS_PER_MINUTE / 60,
+            capacity=Config.GEMINI_REQUEST_BURST,
+        )
+        self.tokens = TokenBucket(
+            rate=Config.GEMINI_TOKENS_PER_MINUTE / 60,
+            capacity=Config.GEMINI_TOKEN_BURST,
+        )
+        # One queue per priority class: user_id -> deque of waiting tickets
+        self._queues = (OrderedDict(), OrderedDict())
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.stats = {'admitted': 0, 'throttled': 0}
+
+    def __len__(self):
+        return sum(len(q) for queues in self._queues for q in queues.values())
+
+    async def admit(self, user_id, tokens: int, priority: int = INTERACTIVE) -> bool:
+        """Wait for budget to send one message to Gemini; False if it ran out"""
+        loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+        
+        max_wait = Config.GEMINI_QUEUE_MAX_WAIT if priority == INTERACTIVE else Config.GEMINI_BULK_MAX_WAIT
+        # An estimate above the burst size could never be granted
+        tokens = min(tokens, self.tokens.capacity)
+        future = loop.create_future()
+        self._queues[priority].setdefault(user_id, deque()).append(
+            (future, tokens, loop.time() + max_wait)
+        )
+        self._wakeup.set()
+        
+        granted = await future
+        self.stats['admitted' if granted else 'throttled'] += 1
+        return granted
+
+    def try_admit(self, tokens: int) -> bool:
+        """Take budget for one extra request right now, without queueing.
+        
+        Used for optional calls (hedges): they only ever use spare budget,
+        never budget someone is waiting for.
+        """
+        tokens = min(tokens, self.tokens.capacity)
+        if len(self) or self.requests.wait_time(1) > 0 or self.tokens.wait_time(tokens) > 0:
+            return False
+        self.requests.try_acquire(1)
+        self.tokens.try_acquire(tokens)
+        return True
+
+    def adjust(self, requests: float = 0, tokens: float = 0):
+        """Correct the budget once real usage is known (negative values refund)"""
+        self.requests.tokens = min(self.requests.capacity, self.requests.tokens - requests)
+        self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens - tokens)
+
+    def _head(self):
+        """Next ticket to serve: highest priority class, then round-robin by user"""
+        for queues in self._queues:
+            while queues:
+                user_id, queue = next(iter(queues.items()))
+                while queue and queue[0][0].done():   # caller went away
+                    queue.popleft()
+                if queue:
+                    return queues, user_id, queue
+                del queues[user_id]
+        return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            head = self._head()
+            if head is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            queues, user_id, queue = head
+            future, tokens, deadline = queue[0]
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            
+            if loop.time() + wait > deadline:
+                queue.popleft()
+                future.set_result(False)
+            elif wait > 0:
+                # A higher-priority arrival re-picks the head instead of waiting behind this one
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            else:
+                self.requests.try_acquire(1)
+                self.tokens.try_acquire(tokens)
+                queue.popleft()
+                future.set_result(True)
+            
+            # This user goes to the back of the line for their class
+            if queue:
+                queues.move_to_end(user_id)
+            else:
+                del queues[user_id]
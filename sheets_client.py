@@ -0,0 +1,96 @@
+import gspread
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from oauth2client.service_account import ServiceAccountCredentials
+from config import Config
+
+SCOPE = [
+    'https://spreadsheets.google.com/feeds',
+    'https://www.googleapis.com/auth/drive'
+]
+
+
+class SheetsClientPool:
+    """One authorized gspread client shared by every shard.
+
+    The client's HTTP session keeps a pool of keep-alive connections, the
+    spreadsheet is opened once, and worksheet handles are cached by title
+    (LRU), so per-user requests don't pay for open_by_key()/worksheet()
+    lookups. The access token is refreshed before it expires rather than
+    on the first request that fails.
+    """
+
+    def __init__(self):
+        self.creds = ServiceAccountCredentials.from_json_keyfile_name(
+            Config.CREDENTIALS_FILE, SCOPE
+        )
+        self.client = gspread.authorize(self.creds)
+        self._mount_connection_pool()
+        self.spreadsheet = self.client.open_by_key(Config.GOOGLE_SHEET_ID)
+
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()   # title -> Worksheet
+
+    def _mount_connection_pool(self):
+        session = getattr(getattr(self.client, 'http_client', None), 'session', None)
+        if session is None:
+            return
+        import requests
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=Config.SHEETS_HTTP_POOL_SIZE,
+            pool_maxsize=Config.SHEETS_HTTP_POOL_SIZE,
+        )
+        session.mount('https://', adapter)
+
+    def worksheet(self, title: str, create_fn=None):
+        """Cached worksheet handle; create_fn(spreadsheet, title) builds a missing one"""
+        with self._lock:
+            handle = self._handles.get(title)
+            if handle is not None:
+                self._handles.move_to_end(title)
+                return handle
+
+        try:
+            handle = self.spreadsheet.worksheet(title)
+        except gspread.WorksheetNotFound:
+            if create_fn is None:
+                raise
+            handle = create_fn(self.spreadsheet, title)
+
+        with self._lock:
+            self._handles[title] = handle
+            while len(self._handles) > Config.SHEETS_HANDLE_CACHE_SIZE:
+                self._handles.popitem(last=False)
+        return handle
+
+    def forget(self, title: str):
+        """Drop a cached handle (e.g. after the worksheet was deleted)"""
+        with self._lock:
+            self._handles.pop(title, None)
+
+    def refresh_token_if_needed(self) -> bool:
+        """Refresh the access token when it is within the refresh margin of expiry"""
+        # gspread converts the oauth2client credentials to google-auth ones
+        # and signs requests with those, so that's the token to keep fresh
+        auth = getattr(getattr(self.client, 'http_client', None), 'auth', None)
+        if auth is None or not hasattr(auth, 'refresh'):
+            return False
+        expiry = getattr(auth, 'expiry', None)
+        margin = timedelta(seconds=Config.SHEETS_TOKEN_REFRESH_MARGIN)
+        if expiry is not None and expiry - datetime.utcnow() > margin:
+            return False
+        from google.auth.transport.requests import Request
+        auth.refresh(Request())
+        return True
+
+    def run_token_refresher(self, stop: threading.Event):
+        """Blocking loop for a background thread; checks the token once a minute"""
+        while not stop.wait(60):
+            try:
+                if self.refresh_token_if_needed():
+                    print("🔑 Refreshed Sheets access token")
+            except Exception as e:
+                print(f"Error refreshing Sheets token: {e}")
+                time.sleep(5)
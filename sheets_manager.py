@@ -1,93 +1,567 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from config import Config
+from expense import Expense
+from batching import MicroBatcher
+from budgets import BudgetTracker
+from ledger import Ledger
+from metrics import STAGE_SECONDS
+from rate_limit import TokenBucket
+from reports import ReportStore
+from sheets_client import SheetsClientPool
+from spool import Spool
 from datetime import datetime
+import asyncio
+import copy
+import hashlib
+import random
+import re
+import threading
+import time
+import uuid
+
+HEADERS = [
+    "Date", "Amount", "Currency", "Category", "Sub-Category",
+    "Item", "Vendor", "Payment Mode", "Notes",
+    "Raw Message", "Timestamp", "Row ID"
+]
+
+def shard_title(user_id: int = None, chat_id: int = None) -> str:
+    """Worksheet that holds a user's (or chat's) expenses under SHEET_SHARDING"""
+    key = {'user': user_id, 'chat': chat_id}.get(Config.SHEET_SHARDING)
+    return f"{Config.SHEET_NAME}-{key}" if key is not None else Config.SHEET_NAME
+
+def shard_user(title: str) -> int:
+    """User a worksheet belongs to under SHEET_SHARDING=user (None for shared ones)"""
+    prefix = f"{Config.SHEET_NAME}-"
+    if Config.SHEET_SHARDING != 'user' or not title.startswith(prefix):
+        return None
+    try:
+        return int(title[len(prefix):])
+    except ValueError:
+        return None
 
 class SheetsManager:
     def __init__(self):
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
+        self.pool = SheetsClientPool()
+        self.client = self.pool.client
+        self.sheet = self.pool.spreadsheet
+        # Shared worksheet: unsharded mode, and rows logged before sharding
+        self.worksheet = self.pool.worksheet(Config.SHEET_NAME, self._create_worksheet)
+        self._upgrade_headers(self.worksheet)
+        
+        self.stats = {'rows_written': 0, 'write_errors': 0, 'sync_errors': 0}
         
-        creds = ServiceAccountCredentials.from_json_keyfile_name(
-            Config.CREDENTIALS_FILE, scope
+        # Local indexed mirror of the sheet; summaries never hit the Sheets API.
+        # Call sync_ledger() to catch up with rows added in the sheet itself.
+        self.ledger = Ledger()
+        self._read_quota = TokenBucket(
+            rate=Config.SHEETS_READS_PER_MINUTE / 60,
+            capacity=Config.SHEETS_READ_BURST,
         )
-        self.client = gspread.authorize(creds)
-        self.sheet = self.client.open_by_key(Config.GOOGLE_SHEET_ID)
-        self.worksheet = self._get_or_create_worksheet()
+        # Columnar per-user copies of the ledger for /week, /month and /category
+        self.reports = ReportStore(self.ledger)
+        # Running month-to-date spend per user/category, checked on every save
+        self.budgets = BudgetTracker(self.ledger)
         
-    def _get_or_create_worksheet(self):
-        """Get worksheet or create with headers if doesn't exist"""
-        try:
-            worksheet = self.sheet.worksheet(Config.SHEET_NAME)
-        except gspread.WorksheetNotFound:
-            worksheet = self.sheet.add_worksheet(
-                title=Config.SHEET_NAME, 
-                rows=1000, 
-                cols=11
-            )
-            # Add headers
-            headers = [
-                "Date", "Amount", "Currency", "Category", "Sub-Category",
-                "Item", "Vendor", "Payment Mode", "Notes", 
-                "Raw Message", "Timestamp"
-            ]
-            worksheet.append_row(headers)
-            
-            # Format headers (bold)
-            worksheet.format('A1:K1', {
-                "textFormat": {"bold": True},
-                "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9}
-            })
-            
+        # Every expense is journaled here before the user is told it's saved;
+        # the sync worker drains it to the sheet at a quota-safe pace
+        self.spool = Spool()
+        self._write_quota = TokenBucket(
+            rate=Config.SHEETS_WRITES_PER_MINUTE / 60,
+            capacity=Config.SHEETS_WRITE_BURST,
+        )
+        self._spool_ready = asyncio.Event()
+        self._sync_task = None
+        # row_id -> (worksheet, row): corrections to rows already sent to the sheet
+        self._corrections = {}
+        
+        # Rows queued within the flush window share one spool fsync
+        self._writer = MicroBatcher(
+            self._spool_rows,
+            max_size=Config.SHEETS_BATCH_SIZE,
+            max_delay=Config.SHEETS_FLUSH_INTERVAL,
+        )
+        
+        # Refresh the OAuth token ahead of expiry, off the request path
+        self._refresher_stop = threading.Event()
+        threading.Thread(
+            target=self.pool.run_token_refresher, args=(self._refresher_stop,), daemon=True
+        ).start()
+    
+    @staticmethod
+    def _create_worksheet(sheet, title: str):
+        """Create a worksheet with bold headers"""
+        # Only the header row: appends grow the grid, and every cell counts
+        # towards the spreadsheet's 10M cell limit, whatever the shard count
+        worksheet = sheet.add_worksheet(
+            title=title, 
+            rows=2, 
+            cols=len(HEADERS)
+        )
+        # Add headers
+        worksheet.append_row(HEADERS)
+        
+        # Format headers (bold)
+        worksheet.format('A1:L1', {
+            "textFormat": {"bold": True},
+            "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9}
+        })
         return worksheet
     
-    async def add_expense(self, expense_data: dict) -> bool:
-        """Add expense row to sheet"""
+    @staticmethod
+    def _upgrade_headers(worksheet):
+        """Sheets created before row ids existed get the extra column"""
+        if worksheet.col_count < len(HEADERS):
+            worksheet.add_cols(len(HEADERS) - worksheet.col_count)
+        if worksheet.acell('L1').value != HEADERS[-1]:
+            worksheet.update_acell('L1', HEADERS[-1])
+    
+    def _worksheet(self, title: str):
+        """Cached handle for a shard, created on first use"""
+        return self.pool.worksheet(title, self._create_worksheet)
+    
+    def _shard_sizes(self) -> dict:
+        """Grid row count of the shared worksheet and every per-user/per-chat shard
+        (one metadata call)"""
+        prefix = f"{Config.SHEET_NAME}-"
+        return {
+            ws.title: ws.row_count for ws in self.sheet.worksheets()
+            if ws.title == Config.SHEET_NAME or ws.title.startswith(prefix)
+        }
+    
+    def _last_modified(self) -> float:
+        """When anything in the spreadsheet last changed (Drive modifiedTime, epoch seconds)"""
+        try:
+            modified = self.sheet.get_lastUpdateTime()
+            return datetime.fromisoformat(modified.replace('Z', '+00:00')).timestamp()
+        except Exception as e:
+            print(f"Could not read the sheet's modified time: {e}")
+            return float('inf')
+    
+    @staticmethod
+    def _row_checksum(row: list) -> str:
+        return hashlib.sha1("\x1f".join(str(c).strip() for c in row).encode()).hexdigest()
+    
+    @staticmethod
+    def _page_checksum(page: list) -> str:
+        return hashlib.sha1("\x1e".join(SheetsManager._row_checksum(row) for row in page).encode()).hexdigest()
+    
+    def sync_ledger(self):
+        """Pull rows added or edited in the sheet since the last sync into the ledger.
+        
+        Usually only the range from each shard's watermark row down is
+        fetched, all shards in one batched values request. That catches
+        appended rows, and a changed watermark row (rows inserted or
+        deleted above it) triggers a full rescan of the shard. Edits to
+        rows above the watermark leave it alone, so each shard is also
+        rescanned once it hasn't been for SHEETS_VERIFY_INTERVAL seconds,
+        unless the spreadsheet's Drive modifiedTime shows nothing has
+        changed since. All reads are paced by the Sheets read quota.
+        """
         try:
-            row = [
-                expense_data.get('date', ''),
-                expense_data.get('amount', 0),
-                expense_data.get('currency', Config.DEFAULT_CURRENCY),
-                expense_data.get('category', 'Other'),
-                expense_data.get('sub_category', ''),
-                expense_data.get('item', ''),
-                expense_data.get('vendor', 'Unknown'),
-                expense_data.get('payment_mode', 'Unknown'),
-                expense_data.get('notes', ''),
-                expense_data.get('raw_message', ''),
-                expense_data.get('timestamp', datetime.now().isoformat())
-            ]
+            sizes = self._shard_sizes()
+            states = {title: self.ledger.get_sync_state(title) for title in sizes}
+            rescan = [t for t in sizes if states[t][0] < 1] + self._due_for_verify(sizes)
+            tail_reads = [t for t in sizes if t not in rescan]
             
-            self.worksheet.append_row(row, value_input_option='USER_ENTERED')
-            return True
+            chunk = Config.SHEETS_SYNC_BATCH_RANGES
+            for i in range(0, len(tail_reads), chunk):
+                batch = tail_reads[i:i + chunk]
+                self._read_quota.wait()
+                response = self.sheet.values_batch_get(
+                    [f"'{title}'!A{states[title][0]}:L" for title in batch]
+                )
+                for title, value_range in zip(batch, response.get('valueRanges', [])):
+                    if not self._apply_tail(title, *states[title], value_range.get('values', [])):
+                        print(f"🔄 {title} changed above row {states[title][0]}, rescanning")
+                        rescan.append(title)
             
+            self._rescan(rescan, sizes)
         except Exception as e:
-            print(f"Error adding to sheet: {e}")
+            self.stats['sync_errors'] += 1
+            print(f"Error syncing ledger: {e}")
+    
+    def _due_for_verify(self, sizes: dict) -> list:
+        """Shards whose last full scan is older than SHEETS_VERIFY_INTERVAL and
+        that may have been edited since"""
+        verified = self.ledger.get_verified_times()
+        now = time.time()
+        due = [t for t in sizes if t in verified and now - verified[t] >= Config.SHEETS_VERIFY_INTERVAL]
+        if not due:
+            return []
+        modified = self._last_modified()
+        unchanged = [t for t in due if verified[t] > modified]
+        if unchanged:
+            self.ledger.set_verified(unchanged, now)
+        return [t for t in due if verified[t] <= modified]
+    
+    def _apply_tail(self, title: str, last_row: int, checksum: str, values: list) -> bool:
+        """Apply rows read from a shard's watermark row down; False if the
+        watermark row no longer matches (the shard needs a rescan)"""
+        if not values or self._row_checksum(values[0]) != checksum:
             return False
+        
+        new_rows = values[1:]
+        if new_rows:
+            self.ledger.upsert_sheet_rows(
+                new_rows, title, first_sheet_row=last_row + 1, user_id=shard_user(title)
+            )
+            self.ledger.set_sync_state(
+                title, last_row + len(new_rows), self._row_checksum(new_rows[-1])
+            )
+            print(f"📒 Synced {len(new_rows)} new row(s) from {title}")
+        return True
     
-    def get_today_total(self) -> float:
-        """Get today's total expenses"""
+    def _rescan(self, titles: list, sizes: dict):
+        """Re-read whole worksheets (header row excluded) up to their grid size.
+        
+        Pages of all the shards are packed into batched values requests of
+        SHEETS_SYNC_BATCH_RANGES ranges. Each shard is applied as soon as
+        all its pages are in, so a failed read only loses the shards not
+        reached yet; they are retried on the next sync.
+        """
+        page_size = Config.SHEETS_SYNC_PAGE_SIZE
+        ranges = [
+            (title, start) for title in titles
+            for start in range(2, max(sizes.get(title, 0), 2) + 1, page_size)
+        ]
+        remaining = {}
+        for title, _ in ranges:
+            remaining[title] = remaining.get(title, 0) + 1
+        started = time.time()
+        pages = {}
+        
+        chunk = Config.SHEETS_SYNC_BATCH_RANGES
+        for i in range(0, len(ranges), chunk):
+            batch = ranges[i:i + chunk]
+            self._read_quota.wait()
+            response = self.sheet.values_batch_get(
+                [f"'{title}'!A{start}:L{start + page_size - 1}" for title, start in batch]
+            )
+            for (title, start), value_range in zip(batch, response.get('valueRanges', [])):
+                pages.setdefault(title, {})[start] = value_range.get('values', [])
+                remaining[title] -= 1
+                if not remaining[title]:
+                    self._apply_rescan(title, pages.pop(title), started)
+    
+    def _apply_rescan(self, title: str, pages: dict, started: float):
+        """Apply the pages of a full rescan. Pages whose checksum matches the
+        previous scan are already in the ledger and are skipped; blank pages
+        and gaps don't end the scan, only the grid size does."""
+        page_size = Config.SHEETS_SYNC_PAGE_SIZE
+        known = self.ledger.get_page_checksums(title)
+        blank = self._page_checksum([])
+        checksums, changed, last_row, tail = {}, 0, 1, HEADERS
+        
+        for start in sorted(pages):
+            page = pages[start]
+            checksum = self._page_checksum(page)
+            if known.get(start, blank) != checksum:
+                # Padded so rows blanked since the last scan clear their slots
+                self.ledger.upsert_sheet_rows(
+                    page + [[]] * (page_size - len(page)), title,
+                    first_sheet_row=start, user_id=shard_user(title),
+                )
+                changed += 1
+            if page:
+                checksums[start] = checksum
+                last_row = start + len(page) - 1
+                tail = page[-1]
+        
+        self.ledger.truncate_after(title, last_row)
+        self.ledger.set_page_checksums(title, checksums)
+        # An empty shard is watched from its header row
+        self.ledger.set_sync_state(title, last_row, self._row_checksum(tail))
+        self.ledger.set_verified([title], started)
+        print(f"📒 Full rescan of {title}: {last_row - 1} row(s), {changed}/{len(pages)} page(s) changed")
+    
+    def _build_row(self, expense: Expense, row_id: str = None) -> list:
+        """Convert an Expense to a sheet row (column order matches HEADERS)"""
+        return expense.to_row() + [row_id or uuid.uuid4().hex]
+    
+    async def _spool_rows(self, items: list) -> list:
+        """Journal a batch of (row, user_id, worksheet) durably, returns per-row success"""
+        records = [
+            {'id': row[-1], 'worksheet': title, 'row': row, 'user_id': user_id}
+            for row, user_id, title in items
+        ]
         try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            all_records = self.worksheet.get_all_records()
+            await asyncio.to_thread(self.spool.append, records)
+        except Exception as e:
+            print(f"Error writing {len(records)} row(s) to spool: {e}")
+            return [False] * len(records)
+        
+        try:
+            by_title = {}
+            for record in records:
+                by_title.setdefault(record['worksheet'], []).append(record)
+            for title, shard_records in by_title.items():
+                self.ledger.add_rows(
+                    [r['row'] for r in shard_records], title,
+                    user_ids=[r['user_id'] for r in shard_records],
+                )
+        except Exception as e:
+            # The row is safe in the spool; the sheet sync will bring it into the ledger
+            print(f"Error mirroring rows to ledger: {e}")
+        
+        self._spool_ready.set()
+        return [True] * len(records)
+    
+    @staticmethod
+    def _first_updated_row(response) -> int:
+        """Sheet row number the appended batch starts at, e.g. 'Expenses!A5:L7' -> 5"""
+        try:
+            updated_range = response['updates']['updatedRange']
+            return int(re.search(r'![A-Z]+(\d+)', updated_range).group(1))
+        except (TypeError, KeyError, AttributeError):
+            return None
+    
+    def _resolve_in_doubt(self):
+        """After a crash, find out which in-flight rows already reached the sheet.
+        
+        Reads only the Row ID column below each shard's ledger watermark, so
+        a replay never appends a row twice.
+        """
+        in_doubt = self.spool.in_doubt()
+        if not in_doubt:
+            return
+        
+        by_title = {}
+        for record in in_doubt:
+            by_title.setdefault(record['worksheet'], []).append(record['id'])
+        
+        landed = []
+        for title, ids in by_title.items():
+            last_row, _ = self.ledger.get_sync_state(title)
+            start = max(2, last_row)
+            column = self._worksheet(title).get(f"L{start}:L")
+            found = {cells[0]: start + i for i, cells in enumerate(column) if cells and cells[0]}
+            for row_id in ids:
+                if row_id in found:
+                    self.ledger.mark_synced(title, [row_id], found[row_id])
+                    landed.append(row_id)
+        
+        if landed:
+            self.spool.mark_done(landed)
+        self.spool.clear_doubt([r['id'] for r in in_doubt if r['id'] not in set(landed)])
+        print(f"🔁 Recovered spool: {len(landed)} row(s) already in sheet, "
+              f"{len(in_doubt) - len(landed)} to resend")
+    
+    async def _write_spooled(self, records: list):
+        """Paced append_rows calls for a batch of spooled rows, one per shard"""
+        by_title = {}
+        for record in records:
+            by_title.setdefault(record['worksheet'], []).append(record)
+        
+        for title, shard_records in by_title.items():
+            worksheet = await asyncio.to_thread(self._worksheet, title)
+            ids = [r['id'] for r in shard_records]
+            await self._write_quota.acquire()
+            await asyncio.to_thread(self.spool.mark_sending, ids)
+            # A correction may have replaced a row since it was read; sending rows can't change
+            rows = self.spool.rows(ids)
+            with STAGE_SECONDS.labels(stage='sheet_append').time():
+                response = await asyncio.to_thread(
+                    worksheet.append_rows, rows, value_input_option='USER_ENTERED',
+                )
+            self.stats['rows_written'] += len(shard_records)
+            await asyncio.to_thread(self.spool.mark_done, ids)
             
-            total = sum(
-                float(record['Amount']) 
-                for record in all_records 
-                if record.get('Date') == today
-            )
-            return total
-        except:
-            return 0.0
-
-    def get_today_count(self) -> int:
-        """Get count of today's transactions"""
+            first_row = self._first_updated_row(response)
+            if first_row:
+                self.ledger.mark_synced(title, ids, first_row)
+    
+    async def _write_corrections(self):
+        """Overwrite corrected rows in place, or delete removed ones, once they
+        have landed in the sheet"""
+        pending = self.spool.pending_ids()
+        for row_id in [r for r in self._corrections if r not in pending]:
+            title, row = self._corrections[row_id]
+            if row is None:
+                await self._delete_row(title, row_id)
+                del self._corrections[row_id]
+                continue
+            _, sheet_row = self.ledger.sheet_position(row_id)
+            if sheet_row:
+                worksheet = await asyncio.to_thread(self._worksheet, title)
+                await self._write_quota.acquire()
+                await asyncio.to_thread(
+                    worksheet.update, [row], f"A{sheet_row}:L{sheet_row}",
+                    value_input_option='USER_ENTERED',
+                )
+                # A sheet sync may have read the old values back in the meantime
+                self.ledger.update_rows([row])
+            del self._corrections[row_id]
+    
+    async def _delete_row(self, title: str, row_id: str):
+        """Delete a bot row from the sheet. A blank row would stay in the table,
+        and the next append could be placed into the gap over live rows."""
+        worksheet = await asyncio.to_thread(self._worksheet, title)
+        # Look the row up by id: hand edits may have moved it since the last sync
+        await asyncio.to_thread(self._read_quota.wait)
+        column = await asyncio.to_thread(worksheet.get, "L2:L")
+        position = next((2 + i for i, cells in enumerate(column) if cells and cells[0] == row_id), None)
+        if position is not None:
+            await self._write_quota.acquire()
+            await asyncio.to_thread(worksheet.delete_rows, position)
+            self.ledger.remove_sheet_row(title, position, row_id)
+        else:
+            # Already deleted by hand
+            self.ledger.delete_rows([row_id])
+    
+    async def run_sync_worker(self):
+        """Drain the spool to the sheet forever, with token-bucket pacing and
+        exponential backoff on errors (quota 429s, network blips)"""
+        backoff = 0
+        while True:
+            try:
+                # Rows whose last append may have landed are checked before resending
+                await asyncio.to_thread(self._resolve_in_doubt)
+                
+                records = self.spool.pending(limit=Config.SHEETS_APPEND_MAX_ROWS)
+                if self._corrections:
+                    await self._write_corrections()
+                if not records:
+                    self._spool_ready.clear()
+                    await self._spool_ready.wait()
+                    continue
+                
+                await self._write_spooled(records)
+                backoff = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                backoff = min(max(backoff * 2, 1), Config.SHEETS_MAX_BACKOFF)
+                delay = backoff * random.uniform(0.5, 1.0)
+                print(f"Error syncing spool to sheet ({len(self.spool)} pending), "
+                      f"retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+    
+    def start_sync_worker(self):
+        """Start draining the spool in the background (needs a running loop)"""
+        if self._sync_task is None:
+            self._sync_task = asyncio.get_running_loop().create_task(self.run_sync_worker())
+            # Rows left over from a previous run are picked up straight away
+            self._spool_ready.set()
+    
+    async def add_expense(self, expense: Expense, user_id: int = None, chat_id: int = None,
+                          alerts: list = None, row_id: str = None) -> bool:
+        """Save expense durably; resolves once it is journaled, before the sheet write.
+        
+        Budget thresholds crossed by this expense are appended to `alerts`.
+        Pass a row_id to be able to correct the row later.
+        """
+        title = shard_title(user_id, chat_id)
+        saved = await self._writer.submit((self._build_row(expense, row_id), user_id, title))
+        if saved is True:
+            crossed = self.budgets.record(user_id, expense)
+            if alerts is not None:
+                alerts.extend(crossed)
+        return saved
+    
+    async def add_expenses(self, expenses: list, user_id: int = None, chat_id: int = None) -> list:
+        """Save several expenses, queued together so they share one journal write"""
+        title = shard_title(user_id, chat_id)
+        items = [(self._build_row(expense), user_id, title) for expense in expenses]
+        results = await self._writer.submit_many(items)
+        for expense, result in zip(expenses, results):
+            if result is True:
+                self.budgets.record(user_id, expense)
+        return [result is True for result in results]
+    
+    async def correct_expenses(self, row_ids: list, old: list, new: list,
+                               user_id: int = None, chat_id: int = None) -> list:
+        """Replace saved expenses with a better parse of the same message.
+        
+        Rows are paired up by amount first, then in order; new expenses left
+        over are added and saved rows left over are removed. Returns the
+        changes as (old, new) pairs, with old None for an added expense and
+        new None for a removed one. Rows still in the spool are rewritten
+        (or dropped) there; rows already sent are overwritten (or deleted)
+        in the sheet by the sync worker (best effort, not journaled: after
+        a restart the original row stays).
+        """
+        title = shard_title(user_id, chat_id)
+        saved = list(zip(row_ids, old))
+        pairs, unmatched = [], []
+        for expense in new:
+            match = next((s for s in saved if s[1].amount == expense.amount), None)
+            if match:
+                saved.remove(match)
+                pairs.append((match, expense))
+            else:
+                unmatched.append(expense)
+        pairs.extend(zip(saved, unmatched))
+        added = unmatched[len(saved):]
+        removed = saved[len(unmatched):]
+        
+        changed, rows = [], []
+        for (row_id, expense), better in pairs:
+            corrected = copy.copy(better)
+            # The saved date and raw message stay; only the parsed fields change
+            corrected.day, corrected.ts, corrected.raw_message = expense.day, expense.ts, expense.raw_message
+            if corrected == expense:
+                continue
+            row = self._build_row(corrected, row_id)
+            record = {'id': row_id, 'worksheet': title, 'row': row, 'user_id': user_id}
+            if not self.spool.replace(record):
+                self._corrections[row_id] = (title, row)
+            changed.append((expense, corrected))
+            rows.append(row)
+        
+        for row_id, expense in removed:
+            if self.spool.discard(row_id):
+                self.ledger.delete_rows([row_id])
+            else:
+                # Zeroed in the ledger now, deleted from the sheet once it has landed
+                self._corrections[row_id] = (title, None)
+                rows.append([''] * (len(HEADERS) - 1) + [row_id])
+            changed.append((expense, None))
+        
+        if rows:
+            self.ledger.update_rows(rows)
+        for before, after in changed:
+            self.budgets.replace(user_id, before, after)
+        if changed:
+            self._spool_ready.set()
+        
+        if added:
+            last = old[-1] if old else None
+            for expense in added:
+                if last:
+                    expense.day, expense.ts, expense.raw_message = last.day, last.ts, last.raw_message
+            results = await self.add_expenses(added, user_id=user_id, chat_id=chat_id)
+            changed.extend((None, expense) for expense, ok in zip(added, results) if ok)
+        return changed
+    
+    async def flush(self, timeout: float = None):
+        """Journal queued rows, then give the sync worker up to `timeout`
+        seconds to push the spool to the sheet (call before shutdown)"""
+        await self._writer.flush()
+        timeout = Config.SHUTDOWN_DRAIN_TIMEOUT if timeout is None else timeout
+        deadline = asyncio.get_running_loop().time() + timeout
+        while (len(self.spool) or self._corrections) and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.1)
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        self._refresher_stop.set()
+        if len(self.spool):
+            print(f"📥 {len(self.spool)} row(s) left in spool for the next start")
+    
+    def get_today_summary(self, user_id: int = None) -> tuple:
+        """Get today's (total, count) from the local ledger"""
         try:
             today = datetime.now().strftime("%Y-%m-%d")
-            all_records = self.worksheet.get_all_records()
-            count = sum(1 for record in all_records if record.get('Date') == today)
-            return count
-        except:
-            return 0
+            return self.ledger.summary(today, user_id)
+        except Exception as e:
+            print(f"Error reading ledger: {e}")
+            return 0.0, 0
+    
+    def get_today_total(self, user_id: int = None) -> float:
+        """Get today's total expenses"""
+        return self.get_today_summary(user_id)[0]
+
+    def get_today_count(self, user_id: int = None) -> int:
+        """Get count of today's transactions"""
+        return self.get_today_summary(user_id)[1]
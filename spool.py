@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from config import Config
+
+
+class Spool:
+    """Append-only, fsynced journal of rows waiting to be written to the sheet.
+
+    Each line is a JSON record:
+      {"op": "add", "id": ..., "worksheet": ..., "row": [...], "user_id": ...}
+      {"op": "sending", "ids": [...]}   - about to call append_rows
+      {"op": "done", "ids": [...]}      - rows are in the sheet
+
+    Rows that were "sending" when the process died may or may not have
+    reached the sheet; they are reported by in_doubt() so the caller can
+    check the sheet for their ids before writing them again.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.SPOOL_PATH
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()   # id -> add record
+        self._sending = set()
+        self._lines = 0
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        try:
+            f = open(self.path, encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn last line from a crash mid-write; its rows were never acknowledged
+                    continue
+                self._lines += 1
+                op = record.get('op')
+                if op == 'add':
+                    self._pending[record['id']] = record
+                elif op == 'sending':
+                    self._sending.update(record['ids'])
+                elif op == 'done':
+                    for row_id in record['ids']:
+                        self._pending.pop(row_id, None)
+                        self._sending.discard(row_id)
+        if self._pending:
+            print(f"📥 Spool has {len(self._pending)} row(s) waiting for the sheet")
+
+    def _write(self, records: list, sync: bool):
+        self._file.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+        self._lines += len(records)
+
+    def append(self, records: list):
+        """Durably journal new rows (one fsync for the whole batch)"""
+        records = [dict(record, op='add') for record in records]
+        with self._lock:
+            self._write(records, sync=True)
+            for record in records:
+                self._pending[record['id']] = record
+
+    def replace(self, record: dict) -> bool:
+        """Journal new contents for a row that hasn't been sent yet.
+
+        Returns False if the row is no longer pending or is being sent (it
+        has to be corrected in the sheet instead).
+        """
+        record = dict(record, op='add')
+        with self._lock:
+            if record['id'] not in self._pending or record['id'] in self._sending:
+                return False
+            # On load the later add wins; the row keeps its place in the queue
+            self._write([record], sync=True)
+            self._pending[record['id']] = record
+            return True
+
+    def discard(self, row_id: str) -> bool:
+        """Drop a row that hasn't been sent yet; False if it is gone or being sent"""
+        with self._lock:
+            if row_id not in self._pending or row_id in self._sending:
+                return False
+            self._write([{'op': 'done', 'ids': [row_id]}], sync=True)
+            del self._pending[row_id]
+            return True
+
+    def mark_sending(self, ids: list):
+        with self._lock:
+            self._write([{'op': 'sending', 'ids': ids}], sync=True)
+            self._sending.update(ids)
+
+    def mark_done(self, ids: list):
+        with self._lock:
+            self._write([{'op': 'done', 'ids': ids}], sync=False)
+            for row_id in ids:
+                self._pending.pop(row_id, None)
+                self._sending.discard(row_id)
+            if self._lines > Config.SPOOL_COMPACT_LINES and self._lines > 2 * len(self._pending):
+                self._compact()
+
+    def pending(self, limit: int = None) -> list:
+        """Oldest rows not yet confirmed in the sheet"""
+        with self._lock:
+            records = list(self._pending.values())
+        return records[:limit] if limit else records
+
+    def rows(self, ids: list) -> list:
+        """Current contents of pending rows"""
+        with self._lock:
+            return [self._pending[row_id]['row'] for row_id in ids]
+
+    def pending_ids(self) -> set:
+        with self._lock:
+            return set(self._pending)
+
+    def in_doubt(self) -> list:
+        """Pending rows whose append_rows call may have succeeded before a crash"""
+        with self._lock:
+            return [r for row_id, r in self._pending.items() if row_id in self._sending]
+
+    def clear_doubt(self, ids: list):
+        """Rows confirmed absent from the sheet; safe to send again"""
+        with self._lock:
+            self._sending.difference_update(ids)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _compact(self):
+        """Rewrite the journal with only the pending rows (atomic replace)"""
+        tmp_path = f"{self.path}.tmp"
+        records = list(self._pending.values())
+        sending = [row_id for row_id in self._pending if row_id in self._sending]
+        if sending:
+            records.append({'op': 'sending', 'ids': sending})
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lines = len(records)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
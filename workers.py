@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import zlib
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(chat_id, workers: int) -> int:
+    """Stable chat -> worker mapping (hash() is salted per process, crc32 isn't)"""
+    return zlib.crc32(str(chat_id).encode()) % workers
+
+
+def _per_worker_path(path: str, index: int) -> str:
+    """spool.jsonl -> spool.3.jsonl: files a single writer owns can't be shared"""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+class WorkerPool:
+    """N worker processes, each fed through its own multiprocessing queue.
+
+    Updates are routed by chat_id, so a chat always lands on the same
+    worker and its messages are handled in order there. Workers build
+    their own parser, Sheets clients and Telegram Application, each with
+    1/N of the Gemini and Sheets quotas; the ledger database is shared
+    (SQLite WAL handles concurrent writers), while the spool, parse cache
+    and duplicate index get one file per worker. Each worker also answers
+    metrics requests on its own pipe.
+    """
+
+    def __init__(self, size: int):
+        ctx = multiprocessing.get_context('spawn')
+        self.queues = [ctx.Queue() for _ in range(size)]
+        pipes = [ctx.Pipe() for _ in range(size)]
+        self.metrics_conns = [ours for ours, _ in pipes]
+        self._metrics_lock = threading.Lock()
+        self.processes = [
+            ctx.Process(target=_worker_main, args=(i, queue, theirs, size), name=f"expense-worker-{i}")
+            for i, (queue, (_, theirs)) in enumerate(zip(self.queues, pipes))
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        logger.info(f"👷 Started {len(self.processes)} worker processes")
+
+    def dispatch(self, chat_id, update_data: dict):
+        """Queue a raw update (Update.to_dict()) for the chat's worker"""
+        self.queues[shard_for(chat_id, len(self.queues))].put(update_data)
+
+    def collect_metrics(self, timeout: float = 2.0) -> list:
+        """metrics.collect() output of every worker that answers within timeout"""
+        with self._metrics_lock:
+            collections = []
+            for conn in self.metrics_conns:
+                try:
+                    # Drop an answer that came in after an earlier scrape gave up on it
+                    while conn.poll():
+                        conn.recv()
+                    conn.send('collect')
+                    if conn.poll(timeout):
+                        collections.append(conn.recv())
+                except (EOFError, OSError):
+                    continue
+            return collections
+
+    def alive(self) -> int:
+        return sum(process.is_alive() for process in self.processes)
+
+    def stop(self, timeout: float = None):
+        """Ask every worker to drain and exit; terminate the ones that don't"""
+        timeout = Config.SHUTDOWN_DRAIN_TIMEOUT + 5 if timeout is None else timeout
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in time, terminating")
+                process.terminate()
+
+
+def _split_quotas(workers: int):
+    """Give this worker its share of the Gemini and Sheets quotas (they are per project)"""
+    for name in ('GEMINI_REQUESTS_PER_MINUTE', 'GEMINI_TOKENS_PER_MINUTE', 'GEMINI_TOKEN_BURST',
+                 'SHEETS_WRITES_PER_MINUTE'):
+        setattr(Config, name, getattr(Config, name) / workers)
+    # A bucket smaller than one request would never grant it
+    for name in ('GEMINI_REQUEST_BURST', 'SHEETS_WRITE_BURST'):
+        setattr(Config, name, max(1.0, getattr(Config, name) / workers))
+
+
+def _worker_main(index: int, queue, metrics_conn, workers: int):
+    """Entry point of a worker process"""
+    # The dispatcher owns shutdown: workers stop when it sends the sentinel
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Config.SPOOL_PATH = _per_worker_path(Config.SPOOL_PATH, index)
+    Config.PARSE_CACHE_PATH = _per_worker_path(Config.PARSE_CACHE_PATH, index)
+    Config.DEDUP_PATH = _per_worker_path(Config.DEDUP_PATH, index)
+    _split_quotas(workers)
+    
+    import main   # after the overrides: main builds its duplicate index on import
+    asyncio.run(main.run_worker(index, queue, metrics_conn))